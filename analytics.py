@@ -0,0 +1,264 @@
+# Archivo: analytics.py
+"""
+Analítica de demanda sobre el historial de reservas.
+
+Las columnas necesarias (fecha, hora de salida, asientos, categoría y país) se
+leen en una sola consulta y se convierten a arreglos NumPy. Las fechas y horas
+en texto se interpretan una sola vez por valor distinto (hay pocos miles de
+fechas aunque haya millones de reservas); el resto de los cálculos son
+operaciones vectorizadas (bincount, máscaras), sin recorrer reservas en Python.
+
+Cálculos:
+    heatmap        -> reservas y asientos por día de la semana x hora de salida
+    seats_per_day  -> asientos pedidos por día en un rango de fechas
+    forecast       -> pronóstico estacional por día de la semana con tendencia
+
+Requiere: pip install numpy (opcional; sin él el endpoint responde 503)
+
+Uso:
+    python analytics.py --days 90 --horizon 14
+    python benchmark.py analytics --rows 1000000
+"""
+import argparse
+import json
+from datetime import date, timedelta
+
+from flask import Blueprint, jsonify, request
+from sqlalchemy import select
+
+from extensions import db
+from models import Reservation, parse_trip_date
+from users import login_required
+from cache import TTLCache, MISSING
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional; sin él la analítica no está disponible
+    np = None
+
+analytics_bp = Blueprint('analytics', __name__)
+
+WEEKDAYS = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+FORECAST_WEEKS = 8
+# Los cálculos recorren toda la tabla: se reutilizan por un minuto
+analytics_cache = TTLCache(maxsize=64, ttl=60)
+
+COLUMNS = (Reservation.date, Reservation.departure_time, Reservation.capacity_needed,
+           Reservation.service_category, Reservation.country)
+
+
+# ==========================================
+# 1. CARGA EN COLUMNAS
+# ==========================================
+class DemandFrame:
+    """
+    Reservas en formato columnar. 'day' es el ordinal de la fecha del viaje
+    (date.toordinal(), -1 si es 'Pendiente' o inválida) y 'hour' la hora de
+    salida (-1 si no se indicó). Categoría y país se guardan como códigos
+    enteros con su lista de etiquetas.
+    """
+    def __init__(self, day, hour, seats, category, categories, country, countries):
+        self.day = day
+        self.hour = hour
+        self.seats = seats
+        self.category = category
+        self.categories = categories
+        self.country = country
+        self.countries = countries
+
+    def __len__(self):
+        return len(self.day)
+
+    def select(self, category=None, country=None):
+        """Subconjunto filtrado por categoría y/o país (por etiqueta)."""
+        mask = np.ones(len(self), dtype=bool)
+        for value, codes, labels in ((category, self.category, self.categories),
+                                     (country, self.country, self.countries)):
+            if value:
+                if value not in labels:
+                    mask[:] = False  # -1 es el código de los nulos: no se compara contra él
+                    break
+                mask &= codes == labels.index(value)
+        return DemandFrame(self.day[mask], self.hour[mask], self.seats[mask],
+                           self.category[mask], self.categories,
+                           self.country[mask], self.countries)
+
+
+def _day_ordinal(value):
+    trip = parse_trip_date(value)
+    return trip.toordinal() if trip else -1
+
+def _hour(value):
+    """'HH:MM' (input type=time) -> hora, o -1."""
+    if value and len(value) >= 2 and value[:2].isdigit() and int(value[:2]) < 24:
+        return int(value[:2])
+    return -1
+
+def _parse_column(values, parse, dtype):
+    """Interpreta cada valor distinto una sola vez."""
+    memo = {}
+    return np.fromiter((memo[v] if v in memo else memo.setdefault(v, parse(v)) for v in values),
+                       dtype=dtype, count=len(values))
+
+def _factorize(values):
+    """Códigos enteros y etiquetas ordenadas por aparición (None -> -1)."""
+    labels = {}
+    codes = np.fromiter((-1 if v is None else labels.setdefault(v, len(labels)) for v in values),
+                        dtype=np.int16, count=len(values))
+    return codes, list(labels)
+
+
+def frame_from_rows(dates, times, seats, categories, countries):
+    """Construye el DemandFrame a partir de las columnas en texto."""
+    category_codes, category_labels = _factorize(categories)
+    country_codes, country_labels = _factorize(countries)
+    return DemandFrame(
+        day=_parse_column(dates, _day_ordinal, np.int32),
+        hour=_parse_column(times, _hour, np.int8),
+        seats=np.fromiter((s or 0 for s in seats), dtype=np.int32, count=len(seats)),
+        category=category_codes, categories=category_labels,
+        country=country_codes, countries=country_labels,
+    )
+
+
+def load_frame():
+    """
+    Lee las columnas de las reservas activas en una sola consulta.
+    Las canceladas no son demanda y quedan fuera.
+    """
+    rows = db.session.execute(select(*COLUMNS).where(Reservation.status.is_distinct_from('Cancelada'))).all()
+    columns = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+    return frame_from_rows(*columns)
+
+
+# ==========================================
+# 2. CÁLCULOS VECTORIZADOS
+# ==========================================
+def heatmap(frame):
+    """
+    Matrices 7x24 (lunes..domingo x hora) de reservas y asientos.
+    Solo cuentan las reservas con fecha y hora conocidas.
+    """
+    mask = (frame.day >= 0) & (frame.hour >= 0)
+    # date.toordinal() % 7: 0 = domingo -> se corre para que 0 = lunes
+    weekday = (frame.day[mask] + 6) % 7
+    cell = weekday * 24 + frame.hour[mask]
+    counts = np.bincount(cell, minlength=7 * 24).reshape(7, 24)
+    seats = np.bincount(cell, weights=frame.seats[mask], minlength=7 * 24).reshape(7, 24)
+    return counts, seats.astype(np.int64)
+
+
+def seats_per_day(frame, start, end):
+    """Asientos y reservas por día en [start, end] (fechas), días sin viajes en cero."""
+    first, last = start.toordinal(), end.toordinal()
+    mask = (frame.day >= first) & (frame.day <= last)
+    offset = frame.day[mask] - first
+    size = last - first + 1
+    seats = np.bincount(offset, weights=frame.seats[mask], minlength=size).astype(np.int64)
+    counts = np.bincount(offset, minlength=size)
+    return seats, counts
+
+
+def forecast(frame, today, horizon=14, weeks=FORECAST_WEEKS):
+    """
+    Pronóstico estacional simple de asientos por día.
+    Base: promedio de cada día de la semana en las últimas 'weeks' semanas.
+    Tendencia: recta ajustada a los totales semanales, aplicada como factor
+    relativo a la semana promedio (nunca negativo).
+    """
+    start = today - timedelta(days=weeks * 7)
+    seats, _ = seats_per_day(frame, start, today - timedelta(days=1))
+    weekly = seats.reshape(weeks, 7)                 # fila = semana, columna = día relativo
+    profile = weekly.mean(axis=0)
+
+    totals = weekly.sum(axis=1)
+    mean_week = totals.mean()
+    if weeks > 1 and mean_week > 0:
+        slope, intercept = np.polyfit(np.arange(weeks), totals, 1)
+    else:
+        slope, intercept = 0.0, mean_week
+
+    steps = np.arange(horizon)
+    # Semana futura de cada día (weeks = primera semana después del historial)
+    future_week = weeks + steps // 7
+    trend = (intercept + slope * future_week) / mean_week if mean_week > 0 else np.ones(horizon)
+    values = np.maximum(profile[steps % 7] * trend, 0)
+    return [today + timedelta(days=int(i)) for i in steps], values
+
+
+# ==========================================
+# 3. ENDPOINT DEL DASHBOARD
+# ==========================================
+def demand_report(frame, today, days=30, horizon=14):
+    """Resultado serializable a JSON con los tres cálculos."""
+    counts, seats = heatmap(frame)
+    start = today - timedelta(days=days)
+    daily_seats, daily_counts = seats_per_day(frame, start, today + timedelta(days=days))
+    forecast_days, forecast_seats = forecast(frame, today, horizon)
+
+    return {
+        'rows': len(frame),
+        'heatmap': {
+            'weekdays': WEEKDAYS,
+            'reservations': counts.tolist(),
+            'seats': seats.tolist(),
+        },
+        'seats_per_day': [
+            {'day': (start + timedelta(days=i)).isoformat(),
+             'reservations': int(daily_counts[i]), 'seats': int(daily_seats[i])}
+            for i in range(len(daily_seats))
+        ],
+        'forecast': [
+            {'day': d.isoformat(), 'seats': round(float(v), 1)}
+            for d, v in zip(forecast_days, forecast_seats)
+        ],
+        'categories': frame.categories,
+        'countries': frame.countries,
+    }
+
+
+@analytics_bp.route('/dashboard/analytics')
+@login_required
+def demand_analytics():
+    """
+    Demanda por día/hora, asientos por día y pronóstico (JSON).
+    Filtros opcionales: ?category=...&country=...&days=30&horizon=14
+    """
+    if np is None:
+        return jsonify({'success': False, 'message': 'La analítica requiere numpy en el servidor.'}), 503
+
+    category = request.args.get('category') or None
+    country = request.args.get('country') or None
+    days = min(max(request.args.get('days', 30, type=int), 1), 366)
+    horizon = min(max(request.args.get('horizon', 14, type=int), 1), 90)
+
+    key = (category, country, days, horizon, date.today())
+    report = analytics_cache.get(key)
+    if report is MISSING:
+        frame = analytics_cache.get('frame')
+        if frame is MISSING:
+            frame = load_frame()
+            analytics_cache.set('frame', frame)
+        report = demand_report(frame.select(category, country), date.today(), days, horizon)
+        analytics_cache.set(key, report)
+    return jsonify({'success': True, **report})
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Reporte de demanda (heatmap, asientos por día y pronóstico).")
+    parser.add_argument('--db', help="URI de la base de datos (por defecto la de la app)")
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--horizon', type=int, default=14)
+    parser.add_argument('--category')
+    parser.add_argument('--country')
+    args = parser.parse_args()
+
+    if np is None:
+        raise SystemExit("Se requiere numpy: pip install numpy")
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.db} if args.db else None)
+    with app.app_context():
+        frame = load_frame().select(args.category, args.country)
+        print(json.dumps(demand_report(frame, date.today(), args.days, args.horizon), indent=2,
+                         ensure_ascii=False))
@@ -1,10 +1,18 @@
 # Archivo: app.py
+import os
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
 from extensions import db, bcrypt
+from sessions import init_sessions
+from compression import init_compression
 
-def create_app():
+def create_app(test_config=None):
     """
     Configuración central de la aplicación Flask y registro de extensiones.
+    'test_config' permite sobrescribir la configuración (ej: otra base de datos
+    para el generador de datos sintéticos o los benchmarks).
     """
     app = Flask(__name__)
     
@@ -13,25 +21,60 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///db.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    if test_config:
+        app.config.update(test_config)
+
+    # Reservas archivadas en un archivo SQLite aparte (ver archive.py)
+    main_uri = app.config['SQLALCHEMY_DATABASE_URI']
+    app.config.setdefault('SQLALCHEMY_BINDS', {
+        'archive': main_uri[:-3] + '_archive.db' if main_uri.endswith('.db') else main_uri
+    })
+
     # Inicializar base de datos y encriptación
     db.init_app(app)
     bcrypt.init_app(app)
 
+    # Sesiones del lado del servidor (instance/sessions.db + caché LRU)
+    init_sessions(app)
+
+    # Plantillas compiladas persistentes: cada worker nuevo no recompila desde el fuente
+    # (debe configurarse antes del primer uso de app.jinja_env)
+    jinja_cache_dir = os.path.join(app.instance_path, 'jinja_cache')
+    os.makedirs(jinja_cache_dir, exist_ok=True)
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(jinja_cache_dir)}
+
+    # Compresión gzip/brotli de respuestas (MINIFY_HTML=True para minificar el HTML)
+    init_compression(app)
+
     # Registro de Blueprints
     from rutas import main_bp
     from users import users_bp
     from profile import profile_bp
+    from analytics import analytics_bp
+    from schedules import schedules_bp
+    from pricing import pricing_bp
+    from audit import audit_bp
+    from profiler import profiler_bp
+    from manifests import manifests_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(users_bp) 
     app.register_blueprint(profile_bp)
+    app.register_blueprint(analytics_bp)
+    app.register_blueprint(schedules_bp)
+    app.register_blueprint(pricing_bp)
+    app.register_blueprint(audit_bp)
+    app.register_blueprint(profiler_bp)
+    app.register_blueprint(manifests_bp)
 
     # Inicialización de la base de datos y datos maestros
     with app.app_context():
         import models
+        import archive
         from users import User
         
         db.create_all()
+        upgrade_schema(app)
         
         # --- CONFIGURACIÓN DE SUPERUSUARIOS ---
         # Lista de correos que serán administradores por defecto
@@ -71,6 +114,32 @@ def create_app():
 
     return app
 
+def upgrade_schema(app):
+    """
+    db.create_all() solo crea tablas nuevas. En bases existentes agrega las
+    columnas e índices declarados en los modelos que todavía no existen.
+    """
+    for bind_key, metadata in db.metadatas.items():
+        engine = db.engines[bind_key]
+        inspector = inspect(engine)
+        for table in metadata.sorted_tables:
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            with engine.begin() as conn:
+                for column in table.columns:
+                    if column.name not in existing:
+                        col_type = column.type.compile(dialect=engine.dialect)
+                        conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}'))
+                if table.name == 'collaborator':
+                    # Colaboradores anteriores a feed_secret: cada uno recibe su propio secreto
+                    conn.execute(text("UPDATE collaborator SET feed_secret = lower(hex(randomblob(16))) "
+                                      "WHERE feed_secret IS NULL"))
+            for index in table.indexes:
+                try:
+                    index.create(engine, checkfirst=True)
+                except IntegrityError:
+                    # Datos previos duplicados: el índice único queda pendiente hasta depurarlos
+                    app.logger.warning("No se pudo crear el índice único %s: hay valores duplicados.", index.name)
+
 if __name__ == '__main__':
     app = create_app()
     app.run(debug=True, port=5000)
\ No newline at end of file
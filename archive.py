@@ -0,0 +1,181 @@
+# Archivo: archive.py
+"""
+Archivo histórico de reservas.
+
+Las reservas que ya no están pendientes y cuyo viaje ocurrió hace más de
+ARCHIVE_AFTER_DAYS días se mueven de la tabla 'reservation' a un archivo
+SQLite aparte (bind 'archive', ej: instance/db_archive.db). Cada fila se
+guarda como JSON comprimido con zlib, junto con las columnas necesarias para
+buscarla (id, client_id, fecha). Así la tabla activa que recorren dashboard,
+perfil y exportación se mantiene pequeña.
+
+Uso:
+    python archive.py --days 180
+"""
+import argparse
+import json
+import sys
+import zlib
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select
+
+from extensions import db
+from models import Reservation, StudentSchedule, parse_trip_date
+from tasks import enqueue_rollups
+
+# Al correr 'python archive.py' la app vuelve a importar este módulo: se
+# registra con su nombre para que ArchivedReservation no se defina dos veces
+sys.modules.setdefault('archive', sys.modules[__name__])
+
+ARCHIVE_AFTER_DAYS = 180
+BATCH_SIZE = 500
+
+RESERVATION_COLUMNS = [c.name for c in Reservation.__table__.columns]
+
+
+class ArchivedReservation(db.Model):
+    """
+    Reserva archivada. 'payload' contiene todas las columnas originales
+    como JSON comprimido.
+    """
+    __bind_key__ = 'archive'
+    __tablename__ = 'archived_reservation'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Mismo ID de la reserva original
+    client_id = db.Column(db.Integer, index=True)
+    status = db.Column(db.String(20))
+    trip_date = db.Column(db.String(10), index=True)   # AAAA-MM-DD
+    archived_at = db.Column(db.String(20))
+    payload = db.Column(db.LargeBinary, nullable=False)
+
+
+SCHEDULE_COLUMNS = ('weekdays', 'term_start', 'term_end', 'holidays')
+
+
+def encode_reservation(row, schedule=None):
+    """
+    Comprime una fila de reserva (mapping columna -> valor). Si es un contrato
+    de estudiantes, su regla de recurrencia viaja en la misma carga.
+    """
+    data = {c: row[c] for c in RESERVATION_COLUMNS}
+    if schedule is not None:
+        data['schedule'] = {c: schedule[c] for c in SCHEDULE_COLUMNS}
+    return zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), 6)
+
+def decode_payload(payload):
+    """
+    Reconstruye la reserva archivada como objeto de solo lectura con los
+    mismos atributos que Reservation (las plantillas la usan igual).
+    """
+    data = json.loads(zlib.decompress(payload).decode('utf-8'))
+    schedule = data.pop('schedule', None)
+    return SimpleNamespace(archived=True, schedule=SimpleNamespace(**schedule) if schedule else None, **data)
+
+
+def archivable_rows(cutoff):
+    """
+    (id, fecha) de las reservas no pendientes con viaje anterior a 'cutoff'.
+    Solo lee dos columnas; las fechas en texto se interpretan en Python.
+    Los contratos de estudiantes cuyo curso lectivo sigue vigente no se archivan.
+    Tampoco la reserva de ID más alto: en tablas creadas sin AUTOINCREMENT,
+    SQLite reutilizaría ese ID para la próxima reserva y chocaría con el archivo.
+    """
+    ongoing = select(StudentSchedule.reservation_id).where(StudentSchedule.term_end >= cutoff.isoformat())
+    max_id = db.session.query(func.max(Reservation.id)).scalar()
+    rows = db.session.query(Reservation.id, Reservation.date).filter(Reservation.status != 'Pendiente',
+                                                                     Reservation.id.notin_(ongoing),
+                                                                     Reservation.id != max_id)
+    candidates = []
+    for res_id, raw_date in rows:
+        trip = parse_trip_date(raw_date)
+        if trip and trip < cutoff:
+            candidates.append((res_id, trip))
+    return candidates
+
+
+def archive_reservations(days=None, batch_size=BATCH_SIZE):
+    """
+    Mueve las reservas viejas al archivo, por lotes.
+    Primero se confirma la copia en el archivo y después se borra de la tabla
+    activa: si el proceso se interrumpe entre ambos pasos, la fila queda
+    duplicada (nunca perdida) y la siguiente corrida la reemplaza.
+    """
+    if days is None:
+        days = current_app.config.get('ARCHIVE_AFTER_DAYS', ARCHIVE_AFTER_DAYS)
+    cutoff = date.today() - timedelta(days=days)
+    candidates = archivable_rows(cutoff)
+    archived_at = datetime.now().strftime("%d/%m/%Y %I:%M %p")
+    table = Reservation.__table__
+
+    for start in range(0, len(candidates), batch_size):
+        batch = dict(candidates[start:start + batch_size])
+        rows = db.session.execute(select(table).where(table.c.id.in_(batch))).mappings().all()
+        if not rows:
+            continue
+        ids = [row['id'] for row in rows]
+        schedules = {s['reservation_id']: s for s in db.session.execute(
+            select(StudentSchedule.__table__).where(StudentSchedule.reservation_id.in_(ids))).mappings()}
+        db.session.execute(insert(ArchivedReservation).prefix_with('OR REPLACE'), [{
+            'id': row['id'],
+            'client_id': row['client_id'],
+            'status': row['status'],
+            'trip_date': batch[row['id']].isoformat(),
+            'archived_at': archived_at,
+            'payload': encode_reservation(row, schedules.get(row['id'])),
+        } for row in rows])
+        db.session.commit()
+
+        # El borrado masivo no aplica la cascada del ORM: los contratos se
+        # borran en la misma transacción que sus reservas
+        db.session.execute(delete(StudentSchedule).where(StudentSchedule.reservation_id.in_(ids)))
+        Reservation.query.filter(Reservation.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        # El borrado masivo tampoco pasa por los listeners: se recalculan los resúmenes
+        enqueue_rollups({(row['date'], row['service_category']) for row in rows})
+
+    return len(candidates)
+
+
+def load_archived(client_id, before_id=None, limit=None):
+    """
+    Reservas archivadas de un cliente, las más nuevas primero.
+    'before_id' y 'limit' permiten paginar por ID (ver history.py).
+    """
+    query = db.session.query(ArchivedReservation.payload).filter_by(client_id=client_id)
+    if before_id is not None:
+        query = query.filter(ArchivedReservation.id < before_id)
+    query = query.order_by(ArchivedReservation.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return [decode_payload(payload) for (payload,) in query]
+
+def count_archived(client_id):
+    return ArchivedReservation.query.filter_by(client_id=client_id).count()
+
+
+def merge_history(active, archived):
+    """
+    Une reservas activas y archivadas ordenadas por ID descendente.
+    Si una reserva aparece en ambas (archivado interrumpido), gana la activa.
+    """
+    active_ids = {r.id for r in active}
+    merged = list(active) + [r for r in archived if r.id not in active_ids]
+    merged.sort(key=lambda r: r.id, reverse=True)
+    return merged
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Archiva reservas antiguas no pendientes.")
+    parser.add_argument('--days', type=int, default=None,
+                        help=f"Antigüedad mínima del viaje en días (por defecto {ARCHIVE_AFTER_DAYS})")
+    parser.add_argument('--db', help="URI de la base de datos (por defecto la de la app)")
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.db} if args.db else None)
+    with app.app_context():
+        print(f"Reservas archivadas: {archive_reservations(args.days)}")
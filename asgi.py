@@ -0,0 +1,269 @@
+# Archivo: asgi.py
+"""
+Modo de despliegue ASGI para alta concurrencia.
+
+Las rutas públicas de solo lectura ('/', '/perfil', '/api/get_client/<pin>' y
+'/api/recover_pin') se atienden en el event loop con un driver SQLite
+asíncrono (aiosqlite), así un cliente móvil lento no bloquea un hilo.
+Todo lo demás (dashboard, administración, /reserve...) pasa sin cambios a la
+app Flask original a través del adaptador WSGI -> ASGI.
+
+Requiere: pip install aiosqlite asgiref uvicorn
+
+Uso:
+    uvicorn --factory asgi:create_asgi_app --workers 4   (modo ASGI)
+    gunicorn -w 4 'app:create_app()'                     (modo WSGI, para comparar)
+    python benchmark.py modes --wsgi-url http://127.0.0.1:8000 --asgi-url http://127.0.0.1:8001
+"""
+import asyncio
+import contextlib
+import os
+import re
+from types import SimpleNamespace
+
+import aiosqlite
+from asgiref.wsgi import WsgiToAsgi
+from flask import request, render_template, jsonify
+
+from app import create_app
+from extensions import db
+from profile import flash_search_result
+from archive import decode_payload
+from history import PAGE_SIZE, history_cache, build_page
+from cache import MISSING, rate_limited
+from rutas import client_cache, recover_cache, api_limiter
+
+# Conexiones de lectura abiertas por proceso
+POOL_SIZE = int(os.environ.get('ASGI_DB_POOL_SIZE', 4))
+
+GET_CLIENT_PATH = re.compile(r'^/api/get_client/(?P<pin>[^/]+)$')
+
+
+class AsyncReadPool:
+    """
+    Pool mínimo de conexiones aiosqlite de solo lectura.
+    Se abre en el evento 'lifespan.startup' o, si el servidor no lo envía,
+    con la primera consulta.
+    """
+    def __init__(self, database, size=POOL_SIZE):
+        self.database = database
+        self.size = size
+        self._queue = None
+        self._lock = asyncio.Lock()
+
+    async def open(self):
+        async with self._lock:
+            if self._queue is not None:
+                return
+            queue = asyncio.Queue()
+            for _ in range(self.size):
+                conn = await aiosqlite.connect(f"file:{self.database}?mode=ro", uri=True)
+                conn.row_factory = aiosqlite.Row
+                queue.put_nowait(conn)
+            self._queue = queue
+
+    async def close(self):
+        if self._queue is None:
+            return
+        while not self._queue.empty():
+            await self._queue.get_nowait().close()
+        self._queue = None
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        if self._queue is None:
+            await self.open()
+        conn = await self._queue.get()
+        try:
+            yield conn
+        finally:
+            self._queue.put_nowait(conn)
+
+    async def fetchone(self, sql, params=()):
+        async with self.connection() as conn:
+            async with conn.execute(sql, params) as cursor:
+                return await cursor.fetchone()
+
+    async def fetchall(self, sql, params=()):
+        async with self.connection() as conn:
+            async with conn.execute(sql, params) as cursor:
+                return await cursor.fetchall()
+
+
+# ==========================================
+# 1. VISTAS ASÍNCRONAS (solo lectura)
+# ==========================================
+# Las filas aiosqlite.Row soportan row['campo'], y Jinja resuelve res.campo
+# con __getitem__, por lo que las plantillas funcionan igual que con el ORM.
+
+async def home(pools):
+    about = await pools.main.fetchone("SELECT * FROM about_us ORDER BY id LIMIT 1")
+    return render_template('home.html', about=about)
+
+# Comparten caché y limitador con las vistas WSGI de rutas.py (mismo proceso)
+@rate_limited(api_limiter)
+async def get_client_info(pools, pin):
+    pin = pin.upper()
+    payload = client_cache.get(pin)
+    if payload is MISSING:
+        client = await pools.main.fetchone(
+            "SELECT name, last_name1, last_name2, phone, email FROM client WHERE pin = ?", (pin,))
+        payload = {'success': True, **dict(client)} if client else None
+        client_cache.set(pin, payload)
+    return jsonify(payload or {'success': False})
+
+@rate_limited(api_limiter)
+async def recover_pin(pools):
+    data = request.get_json(silent=True) or {}
+    phone = data.get('phone')
+    email = data.get('email')
+
+    if not phone or not email:
+        return jsonify({'success': False, 'message': 'Por favor ingrese ambos datos.'})
+
+    payload = recover_cache.get((phone, email))
+    if payload is MISSING:
+        client = await pools.main.fetchone(
+            "SELECT pin, name FROM client WHERE phone = ? AND email = ? LIMIT 1", (phone, email))
+        payload = {'success': True, 'pin': client['pin'], 'name': client['name']} if client else None
+        recover_cache.set((phone, email), payload)
+    if payload:
+        return jsonify(payload)
+    return jsonify({'success': False, 'message': 'No encontramos un registro que coincida con ese Teléfono y Email.'})
+
+async def my_requests(pools):
+    client = None
+    history = {'reservations': [], 'next_before': None, 'total': None}
+    pin_searched = ""
+
+    if request.method == 'POST':
+        pin_searched = request.form.get('pin', '').strip().upper()
+        if pin_searched:
+            client = await pools.main.fetchone("SELECT * FROM client WHERE pin = ?", (pin_searched,))
+            if client:
+                history = await client_history(pools, client['id'])
+        flash_search_result(pin_searched, client and client['name'], history['reservations'])
+
+    return render_template('perfil.html', client=client, pin=pin_searched,
+                           reservations=history['reservations'],
+                           next_before=history['next_before'],
+                           total=history['total'])
+
+async def client_history(pools, client_id):
+    """Primera página del historial (equivalente asíncrono de history.client_history)."""
+    cached = history_cache.get(client_id)
+    if cached is not MISSING:
+        return cached
+    active = await pools.main.fetchall(
+        "SELECT * FROM reservation WHERE client_id = ? ORDER BY id DESC LIMIT ?", (client_id, PAGE_SIZE + 1))
+    archived = await pools.archive.fetchall(
+        "SELECT payload FROM archived_reservation WHERE client_id = ? ORDER BY id DESC LIMIT ?",
+        (client_id, PAGE_SIZE + 1))
+    page, next_before = build_page([SimpleNamespace(archived=False, **dict(row)) for row in active],
+                                   [decode_payload(row['payload']) for row in archived], PAGE_SIZE)
+    active_total = await pools.main.fetchone(
+        "SELECT COUNT(*) AS n FROM reservation WHERE client_id = ?", (client_id,))
+    archived_total = await pools.archive.fetchone(
+        "SELECT COUNT(*) AS n FROM archived_reservation WHERE client_id = ?", (client_id,))
+    history = {'reservations': page, 'next_before': next_before,
+               'total': active_total['n'] + archived_total['n']}
+    history_cache.set(client_id, history)
+    return history
+
+
+# ==========================================
+# 2. APLICACIÓN ASGI
+# ==========================================
+class AsyncPublicApp:
+    """
+    Despacha las rutas públicas a las vistas asíncronas y el resto a Flask.
+    Las vistas asíncronas corren dentro de un contexto de petición de Flask
+    para reutilizar plantillas, sesión, mensajes flash y hooks after_request.
+    """
+    def __init__(self, flask_app, database, archive_database):
+        self.flask_app = flask_app
+        self.wsgi_fallback = WsgiToAsgi(flask_app)
+        self.pools = SimpleNamespace(main=AsyncReadPool(database),
+                                     archive=AsyncReadPool(archive_database, size=1))
+
+    def resolve(self, method, path):
+        """Devuelve (vista, kwargs) si la ruta tiene versión asíncrona."""
+        if path == '/' and method == 'GET':
+            return home, {}
+        if path == '/perfil' and method in ('GET', 'POST'):
+            return my_requests, {}
+        if path == '/api/recover_pin' and method == 'POST':
+            return recover_pin, {}
+        match = GET_CLIENT_PATH.match(path)
+        if match and method == 'GET':
+            return get_client_info, match.groupdict()
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        view, kwargs = (None, None)
+        if scope['type'] == 'http':
+            view, kwargs = self.resolve(scope['method'], scope['path'])
+        if view is None:
+            return await self.wsgi_fallback(scope, receive, send)
+
+        body = await self.read_body(receive)
+        response = await self.dispatch(scope, body, view, kwargs)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [(k.encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()],
+        })
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+
+    async def dispatch(self, scope, body, view, kwargs):
+        headers = [(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']]
+        host = dict((k.lower(), v) for k, v in headers).get('host', 'localhost')
+        client_addr = (scope.get('client') or ('127.0.0.1', 0))[0]
+
+        with self.flask_app.test_request_context(
+                scope['path'],
+                base_url=f"{scope.get('scheme', 'http')}://{host}{scope.get('root_path', '')}",
+                method=scope['method'],
+                headers=headers,
+                data=body,
+                query_string=scope.get('query_string', b''),
+                environ_overrides={'REMOTE_ADDR': client_addr}):
+            rv = self.flask_app.preprocess_request()
+            if rv is None:
+                rv = await view(self.pools, **kwargs)
+            response = self.flask_app.make_response(rv)
+            return self.flask_app.process_response(response)
+
+    @staticmethod
+    async def read_body(receive):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.pools.main.open()
+                await self.pools.archive.open()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.pools.main.close()
+                await self.pools.archive.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(test_config=None):
+    """Fábrica para uvicorn: 'uvicorn --factory asgi:create_asgi_app'."""
+    flask_app = create_app(test_config)
+    with flask_app.app_context():
+        database = db.engine.url.database
+        archive_database = db.engines['archive'].url.database
+    return AsyncPublicApp(flask_app, database, archive_database)
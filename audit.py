@@ -0,0 +1,325 @@
+# Archivo: audit.py
+"""
+Bitácora de cambios (solo se agregan eventos, nunca se modifican).
+
+Cada cambio de estado, de rol o eliminación registra un evento con
+record(...). Los eventos se acumulan en la sesión y se insertan todos juntos
+(un solo executemany) justo antes del commit, dentro de la MISMA transacción
+que el cambio: o se guardan ambos o ninguno.
+
+La tabla 'audit_event' guarda los eventos recientes, indexada por entidad y
+por fecha. Cuando crece más de HOT_LIMIT + SEGMENT_ROWS eventos, compact()
+mueve los más viejos, en bloques de SEGMENT_ROWS, a segmentos JSONL
+comprimidos (instance/audit/segment-<primer_id>-<último_id>.jsonl.gz). El
+manifiesto (instance/audit/manifest.json) guarda de cada segmento su rango de
+IDs y fechas y los IDs de las entidades que contiene, así las consultas solo
+abren los segmentos que pueden tener resultados.
+
+Uso:
+    python audit.py history reservation 42
+    python audit.py since "2026-10-01 00:00"
+    python audit.py compact
+"""
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+from flask import Blueprint, current_app, has_request_context, jsonify, request, session
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from extensions import db
+from users import login_required, admin_required
+
+audit_bp = Blueprint('audit', __name__)
+
+# Al correr 'python audit.py' la app vuelve a importar este módulo: se
+# registra con su nombre para que AuditEvent no se defina dos veces
+sys.modules.setdefault('audit', sys.modules[__name__])
+
+HOT_LIMIT = 100000        # Eventos que se quedan en la tabla
+SEGMENT_ROWS = 50000      # Eventos por segmento
+COMPACT_CHECK_EVERY = 1000  # Cada cuántos eventos (por proceso) se encola una revisión
+MAX_RESULTS = 1000
+
+
+class AuditEvent(db.Model):
+    """Evento de la bitácora. 'data' es JSON compacto (ej: {"from": "Pendiente", "to": "Aprobada"})."""
+    __tablename__ = 'audit_event'
+
+    id = db.Column(db.Integer, primary_key=True)
+    ts = db.Column(db.Integer, nullable=False, index=True)   # Segundos desde epoch
+    entity_type = db.Column(db.String(20), nullable=False)   # reservation, user, colab, about
+    entity_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(20), nullable=False)        # status, review, cancel, role, delete
+    actor = db.Column(db.String(50))
+    data = db.Column(db.Text)
+
+    # AUTOINCREMENT: los IDs nunca se reutilizan aunque la tabla se vacíe al compactar
+    __table_args__ = (db.Index('ix_audit_event_entity', 'entity_type', 'entity_id', 'id'),
+                      {'sqlite_autoincrement': True})
+
+    def to_dict(self):
+        return event_dict(self.id, self.ts, self.entity_type, self.entity_id, self.action, self.actor, self.data)
+
+
+def event_dict(id, ts, entity_type, entity_id, action, actor, data):
+    return {'id': id, 'ts': ts, 'entity_type': entity_type, 'entity_id': entity_id,
+            'action': action, 'actor': actor, 'data': json.loads(data) if data else None}
+
+
+# ==========================================
+# 1. REGISTRO (MISMA TRANSACCIÓN)
+# ==========================================
+def current_actor():
+    if has_request_context():
+        return session.get('username') or 'cliente'
+    return 'sistema'
+
+def record(entity_type, entity_id, action, data=None):
+    """
+    Agrega un evento a la transacción en curso; se inserta al hacer commit.
+    Si la transacción se revierte, el evento se descarta.
+    Ej: record('reservation', 42, 'status', {'from': 'Pendiente', 'to': 'Aprobada'})
+    """
+    db.session.info.setdefault('audit_pending', []).append({
+        'ts': int(time.time()),
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'action': action,
+        'actor': current_actor(),
+        'data': json.dumps(data, separators=(',', ':'), ensure_ascii=False) if data else None,
+    })
+
+
+_recorded = 0
+_recorded_lock = threading.Lock()
+
+@event.listens_for(Session, 'before_commit')
+def _write_pending(session):
+    pending = session.info.pop('audit_pending', None)
+    if pending:
+        session.execute(insert(AuditEvent), pending)
+        session.info['audit_written'] = len(pending)
+
+@event.listens_for(Session, 'after_commit')
+def _maybe_schedule_compaction(session):
+    global _recorded
+    written = session.info.pop('audit_written', 0)
+    if not written:
+        return
+    with _recorded_lock:
+        before, _recorded = _recorded, _recorded + written
+    if before // COMPACT_CHECK_EVERY != _recorded // COMPACT_CHECK_EVERY:
+        from tasks import get_queue
+        try:
+            get_queue().enqueue('compact_audit', unique=True)
+        except sqlite3.Error:
+            # Los datos ya están confirmados: la compactación se intenta en el próximo umbral
+            current_app.logger.exception("No se pudo encolar la compactación de la bitácora")
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('audit_pending', None)
+    session.info.pop('audit_written', None)
+
+
+# ==========================================
+# 2. SEGMENTOS Y MANIFIESTO
+# ==========================================
+_manifest_cache = {}
+
+def audit_dir():
+    path = current_app.config.get('AUDIT_DIR') or os.path.join(current_app.instance_path, 'audit')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def load_manifest():
+    """Manifiesto de segmentos (cacheado mientras el archivo no cambie)."""
+    path = os.path.join(audit_dir(), 'manifest.json')
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {'segments': []}
+    cached = _manifest_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    _manifest_cache[path] = (mtime, manifest)
+    return manifest
+
+def _write_atomic(path, write):
+    partial = path + '.part'
+    write(partial)
+    os.replace(partial, path)
+
+def read_segment(segment):
+    """Eventos de un segmento, en orden de ID."""
+    with gzip.open(os.path.join(audit_dir(), segment['file']), 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+def _contains(sorted_ids, value):
+    i = bisect_left(sorted_ids, value)
+    return i < len(sorted_ids) and sorted_ids[i] == value
+
+
+def compact(hot_limit=HOT_LIMIT, segment_rows=SEGMENT_ROWS):
+    """
+    Mueve los eventos más viejos a segmentos mientras sobren al menos
+    'segment_rows' por encima de 'hot_limit'. Devuelve los segmentos creados.
+    Orden seguro: segmento -> manifiesto -> borrado en la tabla. Si se
+    interrumpe antes del borrado, la siguiente corrida solo borra las filas
+    que ya están en un segmento.
+    """
+    manifest = load_manifest()
+    archived_upto = max((s['last_id'] for s in manifest['segments']), default=0)
+    if archived_upto:
+        AuditEvent.query.filter(AuditEvent.id <= archived_upto).delete(synchronize_session=False)
+        db.session.commit()
+
+    created = []
+    while AuditEvent.query.count() - hot_limit >= segment_rows:
+        rows = db.session.query(AuditEvent.id, AuditEvent.ts, AuditEvent.entity_type, AuditEvent.entity_id,
+                                AuditEvent.action, AuditEvent.actor, AuditEvent.data)\
+            .order_by(AuditEvent.id).limit(segment_rows).all()
+        events = [event_dict(*row) for row in rows]
+        first_id, last_id = events[0]['id'], events[-1]['id']
+        filename = f"segment-{first_id:010d}-{last_id:010d}.jsonl.gz"
+
+        def write_segment(path):
+            with gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) as f:
+                for e in events:
+                    f.write(json.dumps(e, separators=(',', ':'), ensure_ascii=False) + '\n')
+        _write_atomic(os.path.join(audit_dir(), filename), write_segment)
+
+        entities = {}
+        for e in events:
+            entities.setdefault(e['entity_type'], set()).add(e['entity_id'])
+        manifest = {'segments': manifest['segments'] + [{
+            'file': filename, 'first_id': first_id, 'last_id': last_id, 'count': len(events),
+            'ts_min': min(e['ts'] for e in events), 'ts_max': max(e['ts'] for e in events),
+            'entities': {k: sorted(v) for k, v in entities.items()},
+        }]}
+
+        def write_manifest(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, separators=(',', ':'), ensure_ascii=False)
+        _write_atomic(os.path.join(audit_dir(), 'manifest.json'), write_manifest)
+
+        AuditEvent.query.filter(AuditEvent.id <= last_id).delete(synchronize_session=False)
+        db.session.commit()
+        created.append(filename)
+    return created
+
+
+# ==========================================
+# 3. CONSULTAS
+# ==========================================
+def history(entity_type, entity_id):
+    """Todos los eventos de una entidad, del más viejo al más nuevo."""
+    events = []
+    for segment in load_manifest()['segments']:
+        if _contains(segment['entities'].get(entity_type, []), entity_id):
+            events.extend(e for e in read_segment(segment)
+                          if e['entity_type'] == entity_type and e['entity_id'] == entity_id)
+    seen = {e['id'] for e in events}
+    hot = AuditEvent.query.filter_by(entity_type=entity_type, entity_id=entity_id).order_by(AuditEvent.id)
+    events.extend(e.to_dict() for e in hot if e.id not in seen)
+    return events
+
+def since(ts, limit=MAX_RESULTS, after_id=0):
+    """
+    Eventos con fecha >= ts (segundos), en orden de ID, hasta 'limit'.
+    'after_id' continúa una consulta anterior (paginación).
+    """
+    events = []
+    for segment in load_manifest()['segments']:
+        if segment['ts_max'] >= ts and segment['last_id'] > after_id:
+            events.extend(e for e in read_segment(segment) if e['ts'] >= ts and e['id'] > after_id)
+            if len(events) >= limit:
+                return events[:limit]
+    last_id = events[-1]['id'] if events else after_id
+    hot = AuditEvent.query.filter(AuditEvent.ts >= ts, AuditEvent.id > last_id)\
+                          .order_by(AuditEvent.id).limit(limit - len(events))
+    events.extend(e.to_dict() for e in hot)
+    return events
+
+
+def parse_since(value):
+    """Epoch en segundos o fecha ISO ('AAAA-MM-DD[ HH:MM[:SS]]')."""
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        pass
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        return None
+
+
+@audit_bp.route('/dashboard/audit/<string:entity_type>/<int:entity_id>')
+@login_required
+@admin_required
+def entity_history(entity_type, entity_id):
+    return jsonify({'success': True, 'events': history(entity_type, entity_id)})
+
+@audit_bp.route('/dashboard/audit')
+@login_required
+@admin_required
+def recent_changes():
+    """
+    Cambios desde ?since=<epoch o fecha ISO> (máximo ?limit=, por defecto 1000).
+    Si hay más, 'next_after_id' se envía como ?after_id= para continuar.
+    """
+    ts = parse_since(request.args.get('since'))
+    if ts is None:
+        return jsonify({'success': False, 'message': "Indique 'since' (epoch o AAAA-MM-DD HH:MM)."}), 400
+    limit = min(max(request.args.get('limit', MAX_RESULTS, type=int), 1), MAX_RESULTS)
+    events = since(ts, limit, request.args.get('after_id', 0, type=int))
+    return jsonify({'success': True, 'events': events,
+                    'next_after_id': events[-1]['id'] if len(events) == limit else None})
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Bitácora de cambios.")
+    parser.add_argument('--db', help="URI de la base de datos (por defecto la de la app)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_history = sub.add_parser('history', help="Eventos de una entidad")
+    p_history.add_argument('entity_type')
+    p_history.add_argument('entity_id', type=int)
+    p_since = sub.add_parser('since', help="Eventos desde una fecha")
+    p_since.add_argument('ts')
+    p_since.add_argument('--limit', type=int, default=MAX_RESULTS)
+    p_compact = sub.add_parser('compact', help="Mueve los eventos viejos a segmentos")
+    p_compact.add_argument('--hot-limit', type=int, default=HOT_LIMIT)
+    p_compact.add_argument('--segment-rows', type=int, default=SEGMENT_ROWS)
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.db} if args.db else None)
+    with app.app_context():
+        if args.command == 'compact':
+            for filename in compact(args.hot_limit, args.segment_rows):
+                print(f"Segmento creado: {filename}")
+        else:
+            if args.command == 'history':
+                events = history(args.entity_type, args.entity_id)
+            else:
+                ts = parse_since(args.ts)
+                if ts is None:
+                    raise SystemExit("Fecha inválida")
+                events = since(ts, args.limit)
+            for e in events:
+                print(f"{datetime.fromtimestamp(e['ts']):%Y-%m-%d %H:%M:%S} #{e['id']} "
+                      f"{e['entity_type']}:{e['entity_id']} {e['action']} por {e['actor']} {e['data'] or ''}")
@@ -0,0 +1,299 @@
+# Archivo: backup.py
+"""
+Respaldos en caliente de las bases SQLite (instance/db.db y su archivo histórico).
+
+La copia usa la API de backup en línea de SQLite por tramos de PAGES_PER_STEP
+páginas, con una pausa entre tramos: el candado de lectura se toma solo
+durante cada tramo y las escrituras de la app siguen entrando entre uno y
+otro. Si otra conexión escribe a mitad de la copia, SQLite la reinicia; tras
+MAX_RESTARTS reinicios se copia lo que falta en un solo paso (un candado
+breve) para no quedar reintentando indefinidamente bajo tráfico constante.
+
+Cada copia se verifica con 'PRAGMA integrity_check' antes de comprimirse con
+gzip (instance/backups/<base>-AAAAMMDD-HHMMSS.db.gz) y se conservan las
+últimas KEEP por base.
+
+Uso:
+    python backup.py run                       -> respalda ahora (db y archivo)
+    python backup.py schedule --every 3600     -> respalda cada hora
+    python backup.py list
+    python backup.py verify db-20261019-120000.db.gz
+    python backup.py restore db-20261019-120000.db.gz
+    python backup.py restore --at "2026-10-19 12:30"   -> último respaldo hasta esa hora
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+from flask import current_app
+
+from extensions import db
+
+PAGES_PER_STEP = 256
+STEP_SLEEP = 0.005        # segundos entre tramos
+MAX_RESTARTS = 3
+KEEP = 14
+STAMP_FORMAT = '%Y%m%d-%H%M%S'
+SUFFIX = '.db.gz'
+
+
+class BackupRestarted(Exception):
+    """Otra conexión modificó la base a mitad de la copia."""
+
+
+# ==========================================
+# 1. RUTAS
+# ==========================================
+def backup_dir():
+    path = current_app.config.get('BACKUP_DIR') or os.path.join(current_app.instance_path, 'backups')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def database_files():
+    """{nombre: ruta} de las bases SQLite de la app (principal y binds)."""
+    files = {}
+    for engine in db.engines.values():
+        path = engine.url.database
+        if engine.url.get_backend_name() == 'sqlite' and path and path != ':memory:':
+            files[os.path.splitext(os.path.basename(path))[0]] = path
+    return files
+
+def parse_snapshot_name(filename):
+    """'db_archive-20261019-120000.db.gz' -> ('db_archive', datetime)."""
+    if not filename.endswith(SUFFIX):
+        return None
+    name, _, stamp = filename[:-len(SUFFIX)].rpartition('-')
+    name, _, day = name.rpartition('-')
+    try:
+        return name, datetime.strptime(f"{day}-{stamp}", STAMP_FORMAT)
+    except ValueError:
+        return None
+
+def list_snapshots(name=None):
+    """[(nombre, fecha, ruta)] ordenados del más viejo al más nuevo."""
+    directory = backup_dir()
+    snapshots = []
+    for filename in os.listdir(directory):
+        parsed = parse_snapshot_name(filename)
+        if parsed and (name is None or parsed[0] == name):
+            snapshots.append((*parsed, os.path.join(directory, filename)))
+    return sorted(snapshots, key=lambda s: (s[0], s[1]))
+
+
+# ==========================================
+# 2. COPIA EN LÍNEA POR TRAMOS
+# ==========================================
+def online_copy(source_path, target_path, pages=PAGES_PER_STEP, sleep=STEP_SLEEP,
+                max_restarts=MAX_RESTARTS):
+    """
+    Copia 'source_path' en 'target_path' con la API de backup.
+    Devuelve la cantidad de reinicios por escrituras concurrentes.
+    """
+    restarts = 0
+    source = sqlite3.connect(source_path, timeout=30)
+    try:
+        while True:
+            target = sqlite3.connect(target_path)
+            last_remaining = None
+
+            def progress(status, remaining, total):
+                nonlocal last_remaining
+                if last_remaining is not None and remaining > last_remaining:
+                    raise BackupRestarted()
+                last_remaining = remaining
+                # sqlite3 solo duerme si la base está ocupada: la pausa entre
+                # tramos (para dejar pasar a los escritores) se hace aquí
+                if remaining and sleep:
+                    time.sleep(sleep)
+
+            step = pages if restarts < max_restarts else -1  # -1: todo lo que falta de una vez
+            try:
+                source.backup(target, pages=step, progress=progress, sleep=sleep)
+                return restarts
+            except BackupRestarted:
+                restarts += 1
+            finally:
+                target.close()
+    finally:
+        source.close()
+
+def integrity_check(path):
+    """Devuelve None si la base está sana o el primer problema que reporta SQLite."""
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    return None if result == 'ok' else result
+
+
+def backup_database(name, path, pages=PAGES_PER_STEP, sleep=STEP_SLEEP, keep=KEEP):
+    """
+    Respalda una base: copia en línea a un temporal, verificación, gzip y
+    rotación. Devuelve un resumen con la ruta del respaldo.
+    """
+    directory = backup_dir()
+    started = time.perf_counter()
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{name}-', suffix='.db', dir=directory)
+    os.close(fd)
+    try:
+        restarts = online_copy(path, tmp_path, pages, sleep)
+        problem = integrity_check(tmp_path)
+        if problem:
+            raise RuntimeError(f"El respaldo de {name} no pasó integrity_check: {problem}")
+
+        final = os.path.join(directory, f"{name}-{datetime.now().strftime(STAMP_FORMAT)}{SUFFIX}")
+        while os.path.exists(final):
+            # Otro respaldo en el mismo segundo: se espera al siguiente para no pisarlo
+            time.sleep(0.1)
+            final = os.path.join(directory, f"{name}-{datetime.now().strftime(STAMP_FORMAT)}{SUFFIX}")
+        partial = final + '.part'
+        with open(tmp_path, 'rb') as src, gzip.open(partial, 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(partial, final)
+    finally:
+        os.remove(tmp_path)
+
+    removed = rotate(name, keep)
+    return {'name': name, 'path': final, 'restarts': restarts, 'removed': removed,
+            'bytes': os.path.getsize(final), 'seconds': round(time.perf_counter() - started, 3)}
+
+def backup_all(**options):
+    return [backup_database(name, path, **options) for name, path in database_files().items()]
+
+def rotate(name, keep=KEEP):
+    """Borra los respaldos más viejos de 'name' dejando los últimos 'keep' (0: no rota)."""
+    snapshots = list_snapshots(name)
+    old = snapshots[:-keep] if keep > 0 else []
+    for _, _, path in old:
+        os.remove(path)
+    return len(old)
+
+
+# ==========================================
+# 3. VERIFICACIÓN Y RESTAURACIÓN
+# ==========================================
+def _decompress(snapshot_path):
+    fd, tmp_path = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(snapshot_path))
+    with os.fdopen(fd, 'wb') as dst, gzip.open(snapshot_path, 'rb') as src:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    return tmp_path
+
+def verify_snapshot(snapshot_path):
+    """Descomprime el respaldo en un temporal y corre integrity_check."""
+    tmp_path = _decompress(snapshot_path)
+    try:
+        return integrity_check(tmp_path)
+    finally:
+        os.remove(tmp_path)
+
+def find_snapshot(name, at):
+    """Último respaldo de 'name' tomado hasta el instante 'at'."""
+    candidates = [s for s in list_snapshots(name) if s[1] <= at]
+    return candidates[-1][2] if candidates else None
+
+def restore_snapshot(snapshot_path):
+    """
+    Restaura un respaldo sobre la base viva. Antes se verifica el respaldo y
+    se respalda el estado actual (así la restauración también se puede
+    deshacer). La escritura usa la API de backup, por lo que las conexiones
+    abiertas de la app ven el contenido nuevo sin corromperse.
+    """
+    parsed = parse_snapshot_name(os.path.basename(snapshot_path))
+    files = database_files()
+    if not parsed or parsed[0] not in files:
+        raise ValueError(f"No se reconoce la base del respaldo {snapshot_path}")
+    name = parsed[0]
+
+    tmp_path = _decompress(snapshot_path)
+    try:
+        problem = integrity_check(tmp_path)
+        if problem:
+            raise RuntimeError(f"El respaldo está dañado: {problem}")
+        safety = backup_database(name, files[name], keep=0)
+        source = sqlite3.connect(tmp_path)
+        target = sqlite3.connect(files[name], timeout=30)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+    finally:
+        os.remove(tmp_path)
+    return safety['path']
+
+
+def run_schedule(every, **options):
+    """Respalda cada 'every' segundos (Ctrl+C para detener)."""
+    while True:
+        started = time.monotonic()
+        for result in backup_all(**options):
+            print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] {result['name']}: {result['path']} "
+                  f"({result['bytes'] / 1024:.0f} KB, {result['seconds']}s, reinicios={result['restarts']})",
+                  flush=True)
+        time.sleep(max(every - (time.monotonic() - started), 0))
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Respaldos en caliente de las bases SQLite.")
+    parser.add_argument('--db', help="URI de la base de datos (por defecto la de la app)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_run = sub.add_parser('run', help="Respalda ahora todas las bases")
+    p_schedule = sub.add_parser('schedule', help="Respalda periódicamente")
+    p_schedule.add_argument('--every', type=int, default=3600, help="Segundos entre respaldos")
+    for p in (p_run, p_schedule):
+        p.add_argument('--pages', type=int, default=PAGES_PER_STEP, help="Páginas por tramo")
+        p.add_argument('--sleep', type=float, default=STEP_SLEEP, help="Pausa entre tramos (s)")
+        p.add_argument('--keep', type=int, default=KEEP, help="Respaldos a conservar por base")
+    sub.add_parser('list', help="Lista los respaldos")
+    p_verify = sub.add_parser('verify', help="Verifica un respaldo (o todos)")
+    p_verify.add_argument('snapshot', nargs='?')
+    p_restore = sub.add_parser('restore', help="Restaura un respaldo sobre la base viva")
+    p_restore.add_argument('snapshot', nargs='?')
+    p_restore.add_argument('--at', help="'AAAA-MM-DD HH:MM[:SS]': último respaldo hasta ese momento")
+    p_restore.add_argument('--database', default='db', help="Base a restaurar con --at (por defecto db)")
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.db} if args.db else None)
+    with app.app_context():
+        def resolve(snapshot):
+            return snapshot if os.path.sep in snapshot else os.path.join(backup_dir(), snapshot)
+
+        if args.command in ('run', 'schedule'):
+            options = {'pages': args.pages, 'sleep': args.sleep, 'keep': args.keep}
+            if args.command == 'schedule':
+                run_schedule(args.every, **options)
+            for result in backup_all(**options):
+                print(f"{result['name']}: {result['path']} ({result['bytes'] / 1024:.0f} KB, "
+                      f"{result['seconds']}s, reinicios={result['restarts']}, rotados={result['removed']})")
+        elif args.command == 'list':
+            for name, taken, path in list_snapshots():
+                print(f"{name:<12} {taken:%Y-%m-%d %H:%M:%S}  {os.path.getsize(path) / 1024:>10.0f} KB  "
+                      f"{os.path.basename(path)}")
+        elif args.command == 'verify':
+            paths = [resolve(args.snapshot)] if args.snapshot else [s[2] for s in list_snapshots()]
+            failed = 0
+            for path in paths:
+                problem = verify_snapshot(path)
+                failed += problem is not None
+                print(f"{os.path.basename(path)}: {problem or 'ok'}")
+            raise SystemExit(1 if failed else 0)
+        else:
+            if args.at:
+                at = datetime.fromisoformat(args.at)
+                path = find_snapshot(args.database, at)
+                if path is None:
+                    raise SystemExit(f"No hay respaldos de {args.database} hasta {args.at}")
+            elif args.snapshot:
+                path = resolve(args.snapshot)
+            else:
+                raise SystemExit("Indique el respaldo o --at")
+            safety = restore_snapshot(path)
+            print(f"Restaurado {os.path.basename(path)} (estado anterior respaldado en {safety})")
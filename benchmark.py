@@ -0,0 +1,713 @@
+# Archivo: benchmark.py
+"""
+Harness de benchmarks para los endpoints principales.
+
+Modos:
+    inprocess -> usa el test client de Flask (sin red, mide la app pura).
+    http      -> golpea un servidor ya levantado (mide el stack completo).
+    compare   -> compara dos resultados guardados (detección de regresiones).
+    modes     -> corre el modo http contra un servidor WSGI y uno ASGI (asgi.py).
+    race      -> envíos simultáneos de un mismo cliente nuevo a /reserve;
+                 falla si se crean clientes duplicados o alguna respuesta no
+                 es 302. Mide también el camino anterior (consultar y luego
+                 escribir) para comparar latencias.
+    analytics -> cálculos de analytics.py sobre N reservas sintéticas
+                 (por defecto 1M), contra el mismo heatmap en Python puro.
+    pricing   -> cotización individual (µs por reserva) y en lote de
+                 pricing.py; verifica que ambas den el mismo monto.
+    backup    -> tráfico concurrente a /reserve mientras backup.py respalda
+                 la base por tramos; falla si alguna respuesta no es 302 o
+                 un respaldo no pasa verify_snapshot. Compara la latencia con
+                 y sin respaldo en curso.
+
+Cada corrida reporta p50/p95/p99 y throughput por endpoint y se guarda en
+instance/benchmarks/<fecha>-<commit>.json.
+
+Uso:
+    python seed.py --clients 2000 --reservations 20000
+    python benchmark.py inprocess --requests 500
+    python benchmark.py http --url http://127.0.0.1:5000 --concurrency 16 \\
+        --email admin@correo.com --password secreto
+    python benchmark.py compare instance/benchmarks/A.json instance/benchmarks/B.json
+    python benchmark.py modes --wsgi-url http://127.0.0.1:8000 --asgi-url http://127.0.0.1:8001 \
+        --endpoints home,get_client,recover_pin,perfil --concurrency 200
+    python benchmark.py race --threads 16 --rounds 20
+    python benchmark.py analytics --rows 1000000
+    python benchmark.py pricing --rows 200000
+    python benchmark.py backup --threads 8 --rounds 3
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import subprocess
+import threading
+import time
+import http.cookiejar
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import flash, redirect, request, url_for
+from sqlalchemy.exc import IntegrityError
+
+from app import create_app
+from extensions import db
+from models import Client
+from seed import DEFAULT_DB_URI
+from users import User
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'benchmarks')
+ENDPOINTS = ['home', 'get_client', 'recover_pin', 'perfil', 'reserve', 'dashboard']
+# Una regresión se reporta si p95 empeora más que este porcentaje
+REGRESSION_THRESHOLD = 0.10
+
+
+# ==========================================
+# 1. ESTADÍSTICAS
+# ==========================================
+def percentile(sorted_values, pct):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def summarize(latencies, wall_time, errors=0):
+    """Resume las latencias (segundos) en milisegundos y req/s."""
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3) if values else 0.0,
+        'throughput_rps': round(len(values) / wall_time, 2) if wall_time else 0.0,
+    }
+
+
+# ==========================================
+# 2. PETICIONES DE CADA ENDPOINT
+# ==========================================
+def reservation_form(rng, pin=None):
+    """Formulario de /reserve; sin PIN se registra un cliente nuevo."""
+    n = rng.randint(0, 10**7)
+    return {
+        'client_pin': pin or '',
+        'client_name': 'Bench',
+        'client_lastname1': 'Carga',
+        'client_lastname2': 'Prueba',
+        'client_phone': f"{n:08d}",
+        'client_email': f"bench{n}@correo.cr",
+        'service_type': 'Servicios Especiales',
+        'day': str(rng.randint(1, 28)), 'month': str(rng.randint(1, 12)), 'year': '2026',
+        'origin': 'San José', 'destination': 'Liberia', 'time': '07:30',
+        'capacity': str(rng.randint(5, 45)), 'pickup': 'no',
+    }
+
+
+def build_requests(endpoint, clients, rng):
+    """Devuelve (método, ruta, formulario, json) para una petición del endpoint indicado."""
+    pin, phone, email = rng.choice(clients) if clients else ('XXXXXXXX', '00000000', 'x@x.cr')
+    if endpoint == 'home':
+        return 'GET', '/', None, None
+    if endpoint == 'get_client':
+        return 'GET', f'/api/get_client/{pin}', None, None
+    if endpoint == 'recover_pin':
+        return 'POST', '/api/recover_pin', None, {'phone': phone, 'email': email}
+    if endpoint == 'perfil':
+        return 'POST', '/perfil', {'pin': pin}, None
+    if endpoint == 'reserve':
+        return 'POST', '/reserve', reservation_form(rng, pin if rng.random() < 0.8 else None), None
+    if endpoint == 'dashboard':
+        return 'GET', '/dashboard', None, None
+    raise ValueError(f"Endpoint desconocido: {endpoint}")
+
+
+def sample_clients(limit=500):
+    """Clientes reales (pin, teléfono, email) para que las búsquedas encuentren datos."""
+    return [tuple(row) for row in db.session.query(Client.pin, Client.phone, Client.email).limit(limit)]
+
+
+# ==========================================
+# 3. MODO EN PROCESO (Flask test client)
+# ==========================================
+def run_inprocess(app, endpoints, n_requests, rng):
+    results = {}
+    with app.app_context():
+        clients = sample_clients()
+        admin = User.query.filter_by(role='admin').first()
+
+    client = app.test_client()
+    if admin:
+        with client.session_transaction() as sess:
+            sess['user_id'] = admin.id
+            sess['username'] = admin.username
+            sess['role'] = admin.role
+
+    for endpoint in endpoints:
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for _ in range(n_requests):
+            method, path, form, json_body = build_requests(endpoint, clients, rng)
+            # Cada petición simula un usuario distinto (el limitador de las APIs es por IP)
+            remote_addr = f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+            t0 = time.perf_counter()
+            response = client.open(path, method=method, data=form, json=json_body,
+                                   environ_base={'REMOTE_ADDR': remote_addr})
+            latencies.append(time.perf_counter() - t0)
+            if response.status_code >= 400:
+                errors += 1
+        results[endpoint] = summarize(latencies, time.perf_counter() - started, errors)
+        print_row(endpoint, results[endpoint])
+    return results
+
+
+# ==========================================
+# 4. MODO HTTP (servidor externo)
+# ==========================================
+def _opener(base_url, email=None, password=None):
+    """Opener con cookies; si se dan credenciales inicia sesión para /dashboard."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    if email and password:
+        body = urllib.parse.urlencode({'email': email, 'password': password}).encode()
+        opener.open(base_url + '/login', data=body).read()
+    return opener
+
+
+def _http_call(opener, base_url, method, path, form, json_body):
+    headers, body = {}, None
+    if form is not None:
+        body = urllib.parse.urlencode(form).encode()
+    elif json_body is not None:
+        body = json.dumps(json_body).encode()
+        headers['Content-Type'] = 'application/json'
+    req = urllib.request.Request(base_url + path, data=body, headers=headers, method=method)
+    t0 = time.perf_counter()
+    try:
+        with opener.open(req, timeout=30) as response:
+            response.read()
+            ok = response.status < 400
+    except Exception:
+        ok = False
+    return time.perf_counter() - t0, ok
+
+
+def run_http(base_url, endpoints, n_requests, concurrency, clients, rng, email=None, password=None):
+    results = {}
+    local = threading.local()
+
+    def worker(request_spec):
+        if not hasattr(local, 'opener'):
+            local.opener = _opener(base_url, email, password)
+        return _http_call(local.opener, base_url, *request_spec)
+
+    for endpoint in endpoints:
+        specs = [build_requests(endpoint, clients, rng) for _ in range(n_requests)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(worker, specs))
+        wall = time.perf_counter() - started
+        latencies = [lat for lat, _ in outcomes]
+        errors = sum(1 for _, ok in outcomes if not ok)
+        results[endpoint] = summarize(latencies, wall, errors)
+        print_row(endpoint, results[endpoint])
+    return results
+
+
+# ==========================================
+# 5. CONCURRENCIA EN EL ALTA DE CLIENTES
+# ==========================================
+def legacy_reserve():
+    """
+    Alta de cliente como la hacía /reserve antes de user-031: consultas
+    separadas de teléfono, email y PIN, y dos commits (cliente y reserva).
+    Solo se usa para medir la diferencia de latencia.
+    """
+    from models import Reservation
+    from rutas import generate_pin
+    form = request.form
+    if Client.query.filter_by(phone=form['client_phone']).first() or \
+            Client.query.filter_by(email=form['client_email']).first():
+        flash("El cliente ya está registrado.", "danger")
+        return redirect(url_for('main.home'))
+    while True:
+        pin = generate_pin()
+        if not Client.query.filter_by(pin=pin).first():
+            break
+    client = Client(pin=pin, name=form['client_name'], last_name1=form['client_lastname1'],
+                    last_name2=form['client_lastname2'], phone=form['client_phone'], email=form['client_email'])
+    db.session.add(client)
+    db.session.commit()
+    db.session.add(Reservation(client=client, date=f"{form['day']}-{form['month']}-{form['year']}",
+                               origin=form['origin'], destination=form['destination'],
+                               departure_time=form['time'], service_category=form['service_type'],
+                               capacity_needed=int(form['capacity'])))
+    db.session.commit()
+    flash("Solicitud enviada correctamente.", "success")
+    return redirect(url_for('main.home'))
+
+
+def dispatch(app, view, form, remote_addr):
+    """Ejecuta 'view' como un POST a /reserve (hooks incluidos); devuelve (segundos, código)."""
+    with app.test_request_context('/reserve', method='POST', data=form,
+                                  environ_base={'REMOTE_ADDR': remote_addr}):
+        t0 = time.perf_counter()
+        try:
+            response = app.preprocess_request() or app.make_response(view())
+            response = app.process_response(response)
+            status = response.status_code
+        except IntegrityError:
+            # El camino anterior no lo manejaba: en producción era un 500
+            db.session.rollback()
+            status = 500
+        return time.perf_counter() - t0, status
+
+
+def run_race(app, threads, rounds, rng):
+    """
+    En cada ronda, 'threads' peticiones envían a la vez el mismo cliente nuevo
+    (mismo teléfono y email), primero por /reserve y después por el camino
+    anterior (legacy_reserve). En /reserve debe quedar exactamente un cliente
+    por ronda y toda respuesta debe ser 302. Como en la carrera casi todas
+    las peticiones terminan en rechazo, la latencia de ambos caminos también
+    se mide con 'threads' altas sin competencia por ronda (signup).
+    """
+    paths = {'reserve_race': app.view_functions['main.create_reservation'],
+             'reserve_race_legacy': legacy_reserve}
+    latencies = {name: [] for name in (*paths, 'reserve_signup', 'reserve_signup_legacy')}
+    failed = {name: 0 for name in latencies}
+    wall = {name: 0.0 for name in latencies}
+    duplicated_rounds = 0
+    for _ in range(rounds):
+        for name, view in paths.items():
+            signup = name.replace('race', 'signup')
+            started = time.perf_counter()
+            for i in range(threads):
+                latency, status = dispatch(app, view, reservation_form(rng), f"10.4.{i}.{rng.randint(1, 254)}")
+                latencies[signup].append(latency)
+                failed[signup] += status != 302
+            wall[signup] += time.perf_counter() - started
+
+        for name, view in paths.items():
+            form = reservation_form(rng)
+            barrier = threading.Barrier(threads)
+
+            def submit(i):
+                barrier.wait()
+                return dispatch(app, view, form, f"10.3.{i}.{rng.randint(1, 254)}")
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                outcomes = list(pool.map(submit, range(threads)))
+            wall[name] += time.perf_counter() - started
+            latencies[name].extend(lat for lat, _ in outcomes)
+            failed[name] += sum(1 for _, status in outcomes if status != 302)
+            if name == 'reserve_race':
+                with app.app_context():
+                    if Client.query.filter_by(phone=form['client_phone']).count() != 1:
+                        duplicated_rounds += 1
+
+    results = {}
+    for name in latencies:
+        results[name] = summarize(latencies[name], wall[name], failed[name])
+        results[name]['rounds'] = rounds
+        print_row(name.replace('reserve_', ''), results[name])
+    results['reserve_race']['rounds_with_duplicates'] = duplicated_rounds
+    print(f"Rondas con clientes duplicados: {duplicated_rounds}/{rounds}")
+    return results
+
+
+def race_failures(results):
+    """Problemas que hacen fallar el modo race (salida distinta de cero)."""
+    stats = results['reserve_race']
+    problems = []
+    if stats['rounds_with_duplicates']:
+        problems.append(f"{stats['rounds_with_duplicates']} ronda(s) crearon clientes duplicados")
+    for name in ('reserve_race', 'reserve_signup'):
+        if results[name]['errors']:
+            problems.append(f"{results[name]['errors']} respuesta(s) de /reserve distintas de 302 ({name})")
+    return problems
+
+
+# ==========================================
+# 6. ANALÍTICA DE DEMANDA
+# ==========================================
+def synthetic_columns(rows, rng):
+    """
+    Columnas en texto como las devuelve la base (fechas en ambos formatos,
+    'Pendiente', horas 'HH:MM', algunos valores nulos).
+    """
+    today = datetime.now().date()
+    days = [today - timedelta(days=i) for i in range(-60, 730)]
+    date_pool = [d.isoformat() for d in days] + [f"{d.day}-{d.month}-{d.year}" for d in days] + ['Pendiente']
+    time_pool = [f"{h:02d}:{m:02d}" for h in range(24) for m in (0, 15, 30, 45)] + [None]
+    categories = ['Transporte de Estudiantes', 'Servicios Especiales', 'Viajes Internacionales']
+    countries = [None, None, None, 'Panamá', 'Nicaragua', 'Guatemala']
+    return ([rng.choice(date_pool) for _ in range(rows)],
+            [rng.choice(time_pool) for _ in range(rows)],
+            [rng.randint(1, 60) for _ in range(rows)],
+            [rng.choice(categories) for _ in range(rows)],
+            [rng.choice(countries) for _ in range(rows)])
+
+
+def python_heatmap(dates, times, seats):
+    """Referencia: el mismo heatmap recorriendo las filas en Python."""
+    from models import parse_trip_date
+    grid = [[0] * 24 for _ in range(7)]
+    for raw_date, raw_time, n in zip(dates, times, seats):
+        trip = parse_trip_date(raw_date)
+        if trip and raw_time:
+            grid[trip.weekday()][int(raw_time[:2])] += n or 0
+    return grid
+
+
+def run_analytics(app, rows, rng):
+    """Tiempo de cada paso de analytics.py sobre 'rows' reservas sintéticas."""
+    import analytics
+    if analytics.np is None:
+        raise SystemExit("El modo analytics requiere numpy: pip install numpy")
+
+    columns = synthetic_columns(rows, rng)
+    today = datetime.now().date()
+    results = {}
+
+    def timed(name, fn):
+        t0 = time.perf_counter()
+        value = fn()
+        elapsed = (time.perf_counter() - t0) * 1000
+        results[name] = {'rows': rows, 'ms': round(elapsed, 2)}
+        print(f"{name:<16} {elapsed:>10.1f} ms")
+        return value
+
+    frame = timed('build_frame', lambda: analytics.frame_from_rows(*columns))
+    _, seats = timed('heatmap', lambda: analytics.heatmap(frame))
+    timed('seats_per_day', lambda: analytics.seats_per_day(frame, today - timedelta(days=365), today))
+    timed('forecast', lambda: analytics.forecast(frame, today, 14))
+    timed('report', lambda: analytics.demand_report(frame, today))
+    grid = timed('python_heatmap', lambda: python_heatmap(columns[0], columns[1], columns[2]))
+
+    if seats.tolist() != grid:
+        print("ADVERTENCIA: el heatmap vectorizado no coincide con la referencia en Python")
+    with app.app_context():
+        db_frame = timed('load_frame_db', analytics.load_frame)
+    results['load_frame_db']['rows'] = len(db_frame)
+    return results
+
+
+def synthetic_quote_rows(rows, rng):
+    """Filas en el orden de pricing.QUOTE_COLUMNS."""
+    categories = ['Transporte de Estudiantes', 'Servicios Especiales', 'Viajes Internacionales']
+    countries = ['Panamá', 'Nicaragua', 'Guatemala', 'México', 'Belice']
+    result = []
+    for _ in range(rows):
+        category = rng.choice(categories)
+        international = category == 'Viajes Internacionales'
+        needs_pickup = rng.random() < 0.3
+        result.append((category, rng.randint(1, 60), rng.randint(1, 10) if international else 0,
+                       rng.choice([None, rng.uniform(5, 600)]), needs_pickup,
+                       ', '.join(f"Parada {i}" for i in range(rng.randint(0, 4))) if needs_pickup else None,
+                       rng.choice(countries) if international else None))
+    return result
+
+
+def run_pricing(app, rows, rng):
+    """µs por cotización individual y tiempo del lote, sobre 'rows' reservas sintéticas."""
+    import pricing
+    data = synthetic_quote_rows(rows, rng)
+    results = {}
+    with app.app_context():
+        table = pricing.get_rates()
+
+    t0 = time.perf_counter()
+    single = [pricing.quote_values(table, *row) for row in data]
+    elapsed = time.perf_counter() - t0
+    results['quote_single'] = {'rows': rows, 'ms': round(elapsed * 1000, 2),
+                               'us_per_quote': round(elapsed / rows * 1e6, 3)}
+    print(f"{'quote_single':<16} {elapsed * 1000:>10.1f} ms  ({elapsed / rows * 1e6:.2f} µs/reserva)")
+
+    t0 = time.perf_counter()
+    batch = pricing.quote_batch(table, data)
+    elapsed = time.perf_counter() - t0
+    results['quote_batch'] = {'rows': rows, 'ms': round(elapsed * 1000, 2),
+                              'vectorized': pricing.np is not None}
+    print(f"{'quote_batch':<16} {elapsed * 1000:>10.1f} ms  (numpy={'sí' if pricing.np is not None else 'no'})")
+
+    mismatches = sum(1 for a, b in zip(single, batch) if a != b)
+    results['quote_batch']['mismatches'] = mismatches
+    if mismatches:
+        print(f"ADVERTENCIA: {mismatches} cotizaciones del lote difieren de la individual")
+    return results
+
+
+# ==========================================
+# 7. RESPALDOS EN CALIENTE
+# ==========================================
+def run_backup(app, threads, rounds, rng, pages):
+    """
+    'threads' hilos envían /reserve sin pausa mientras se hacen 'rounds'
+    respaldos seguidos de 'pages' páginas por tramo. Toda respuesta debe ser
+    302 y cada respaldo debe pasar verify_snapshot (ver backup_failures).
+    Se mide /reserve antes (línea base) y durante.
+    """
+    import backup
+
+    forms = [reservation_form(rng) for _ in range(5000)]
+    counter = iter(range(len(forms)))
+    lock = threading.Lock()
+
+    def traffic(stop, latencies, errors):
+        client = app.test_client()
+        while not stop.is_set():
+            with lock:
+                form = forms[next(counter) % len(forms)]
+            t0 = time.perf_counter()
+            response = client.post('/reserve', data=form,
+                                   environ_base={'REMOTE_ADDR': f"10.2.{rng.randint(0, 255)}.{rng.randint(1, 254)}"})
+            latencies.append(time.perf_counter() - t0)
+            if response.status_code != 302:
+                errors.append(response.status_code)
+
+    def measure(duration=None, work=None):
+        stop, latencies, errors = threading.Event(), [], []
+        workers = [threading.Thread(target=traffic, args=(stop, latencies, errors)) for _ in range(threads)]
+        started = time.perf_counter()
+        for w in workers:
+            w.start()
+        outcome = work() if work else time.sleep(duration)
+        stop.set()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - started
+        return summarize(latencies, elapsed, len(errors)), outcome, elapsed
+
+    def backups():
+        with app.app_context():
+            return [backup.backup_database(name, path, pages=pages, keep=0)
+                    for _ in range(rounds) for name, path in backup.database_files().items()]
+
+    results = {}
+    during, snapshots, elapsed = measure(work=backups)
+    baseline, _, _ = measure(duration=max(elapsed, 1.0))
+    results['reserve_baseline'] = baseline
+    results['reserve_backup'] = during
+    print_row('baseline', baseline)
+    print_row('during', during)
+
+    with app.app_context():
+        failed = [s['path'] for s in snapshots if backup.verify_snapshot(s['path'])]
+        # /reserve escribe en la base principal: si cabe en un tramo, el respaldo no se hizo por tramos
+        main_pages = page_count(db.engine.url.database)
+    for s in snapshots:
+        os.remove(s['path'])
+    results['backups'] = {
+        'count': len(snapshots),
+        'restarts': sum(s['restarts'] for s in snapshots),
+        'max_seconds': max(s['seconds'] for s in snapshots),
+        'failed_integrity': len(failed),
+        'pages_per_step': pages,
+        'main_db_pages': main_pages,
+    }
+    print(f"Respaldos: {len(snapshots)}  reinicios={results['backups']['restarts']}  "
+          f"máx={results['backups']['max_seconds']}s  fallidos={len(failed)}  "
+          f"errores /reserve={during['errors']}")
+    return results
+
+
+def page_count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def backup_failures(results):
+    """Problemas que hacen fallar el modo backup (salida distinta de cero)."""
+    backups, problems = results['backups'], []
+    for label in ('reserve_baseline', 'reserve_backup'):
+        if results[label]['errors']:
+            problems.append(f"{results[label]['errors']} respuesta(s) de /reserve distintas de 302 ({label})")
+        if not results[label]['requests']:
+            problems.append(f"/reserve no respondió ninguna petición ({label})")
+    if not backups['count']:
+        problems.append("No se hizo ningún respaldo")
+    if backups['failed_integrity']:
+        problems.append(f"{backups['failed_integrity']} respaldo(s) no pasaron verify_snapshot")
+    if backups['main_db_pages'] <= backups['pages_per_step']:
+        problems.append(f"La base principal tiene {backups['main_db_pages']} páginas: con --pages "
+                        f"{backups['pages_per_step']} el respaldo no se hace por tramos")
+    return problems
+
+
+# ==========================================
+# 8. PERSISTENCIA Y COMPARACIÓN
+# ==========================================
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'sin-git'
+
+
+def save_results(mode, results, meta):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    commit = git_commit()
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(RESULTS_DIR, f"{stamp}-{commit}-{mode}.json")
+    with open(path, 'w') as f:
+        json.dump({'mode': mode, 'commit': commit, 'created': stamp,
+                   'meta': meta, 'results': results}, f, indent=2)
+    return path
+
+
+def compare(path_a, path_b):
+    """Imprime la diferencia de p95/throughput entre dos corridas guardadas."""
+    with open(path_a) as f:
+        a = json.load(f)
+    with open(path_b) as f:
+        b = json.load(f)
+    return compare_results(a['results'], b['results'])
+
+
+def compare_results(a, b, label_a='A', label_b='B'):
+    """Tabla comparativa; devuelve los endpoints donde B empeora el p95 de A."""
+    print(f"{'endpoint':<12} {'p95 ' + label_a:>10} {'p95 ' + label_b:>10} {'Δp95':>8} "
+          f"{'rps ' + label_a:>9} {'rps ' + label_b:>9}")
+    regressions = []
+    for endpoint in sorted(set(a) & set(b)):
+        ra, rb = a[endpoint], b[endpoint]
+        delta = (rb['p95_ms'] - ra['p95_ms']) / ra['p95_ms'] if ra['p95_ms'] else 0.0
+        flag = ' <- REGRESIÓN' if delta > REGRESSION_THRESHOLD else ''
+        if flag:
+            regressions.append(endpoint)
+        print(f"{endpoint:<12} {ra['p95_ms']:>10.2f} {rb['p95_ms']:>10.2f} {delta:>+7.0%} "
+              f"{ra['throughput_rps']:>9.1f} {rb['throughput_rps']:>9.1f}{flag}")
+    return regressions
+
+
+def print_row(endpoint, stats):
+    print(f"{endpoint:<12} p50={stats['p50_ms']:>8.2f}ms p95={stats['p95_ms']:>8.2f}ms "
+          f"p99={stats['p99_ms']:>8.2f}ms  {stats['throughput_rps']:>8.1f} req/s  errores={stats['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de latencia y throughput por endpoint.")
+    sub = parser.add_subparsers(dest='mode', required=True)
+
+    p_in = sub.add_parser('inprocess', help="Usa el test client de Flask")
+    p_in.add_argument('--db', default=DEFAULT_DB_URI)
+
+    p_http = sub.add_parser('http', help="Golpea un servidor en ejecución")
+    p_http.add_argument('--url', default='http://127.0.0.1:5000')
+    p_http.add_argument('--concurrency', type=int, default=8)
+    p_http.add_argument('--email', help="Usuario para /dashboard")
+    p_http.add_argument('--password')
+    p_http.add_argument('--db', default=DEFAULT_DB_URI, help="Base de datos de donde tomar PINs")
+
+    p_modes = sub.add_parser('modes', help="Compara el servidor WSGI contra el ASGI")
+    p_modes.add_argument('--wsgi-url', default='http://127.0.0.1:8000')
+    p_modes.add_argument('--asgi-url', default='http://127.0.0.1:8001')
+    p_modes.add_argument('--concurrency', type=int, default=64)
+    p_modes.add_argument('--db', default=DEFAULT_DB_URI, help="Base de datos de donde tomar PINs")
+
+    for p in (p_in, p_http, p_modes):
+        p.add_argument('--requests', type=int, default=200, help="Peticiones por endpoint")
+        p.add_argument('--seed', type=int, default=1)
+        p.add_argument('--no-save', action='store_true')
+    for p in (p_in, p_http):
+        p.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    p_modes.add_argument('--endpoints', default='home,get_client,recover_pin,perfil')
+
+    p_race = sub.add_parser('race', help="Altas concurrentes del mismo cliente en /reserve")
+    p_race.add_argument('--db', default=DEFAULT_DB_URI)
+    p_race.add_argument('--threads', type=int, default=16)
+    p_race.add_argument('--rounds', type=int, default=20)
+    p_race.add_argument('--seed', type=int, default=1)
+    p_race.add_argument('--no-save', action='store_true')
+
+    p_an = sub.add_parser('analytics', help="Analítica vectorizada sobre reservas sintéticas")
+    p_an.add_argument('--db', default=DEFAULT_DB_URI, help="Base para medir también la carga real")
+    p_an.add_argument('--rows', type=int, default=1000000)
+    p_an.add_argument('--seed', type=int, default=1)
+    p_an.add_argument('--no-save', action='store_true')
+
+    p_pr = sub.add_parser('pricing', help="Cotización individual y en lote")
+    p_pr.add_argument('--db', default=DEFAULT_DB_URI)
+    p_pr.add_argument('--rows', type=int, default=200000)
+    p_pr.add_argument('--seed', type=int, default=1)
+    p_pr.add_argument('--no-save', action='store_true')
+
+    p_bk = sub.add_parser('backup', help="/reserve concurrente durante respaldos en caliente")
+    p_bk.add_argument('--db', default=DEFAULT_DB_URI)
+    p_bk.add_argument('--threads', type=int, default=8)
+    p_bk.add_argument('--rounds', type=int, default=3, help="Respaldos a realizar")
+    p_bk.add_argument('--pages', type=int, default=64, help="Páginas por tramo del respaldo")
+    p_bk.add_argument('--seed', type=int, default=1)
+    p_bk.add_argument('--no-save', action='store_true')
+
+    p_cmp = sub.add_parser('compare', help="Compara dos resultados guardados")
+    p_cmp.add_argument('a')
+    p_cmp.add_argument('b')
+
+    args = parser.parse_args()
+    if args.mode == 'compare':
+        raise SystemExit(1 if compare(args.a, args.b) else 0)
+
+    rng = random.Random(args.seed)
+    endpoints = [e.strip() for e in getattr(args, 'endpoints', '').split(',') if e.strip()]
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.db})
+
+    failures = []
+    if args.mode == 'race':
+        results = run_race(app, args.threads, args.rounds, rng)
+        failures = race_failures(results)
+        meta = {'db': args.db, 'threads': args.threads, 'rounds': args.rounds}
+    elif args.mode == 'analytics':
+        results = run_analytics(app, args.rows, rng)
+        meta = {'db': args.db, 'rows': args.rows}
+    elif args.mode == 'pricing':
+        results = run_pricing(app, args.rows, rng)
+        meta = {'db': args.db, 'rows': args.rows}
+    elif args.mode == 'backup':
+        results = run_backup(app, args.threads, args.rounds, rng, args.pages)
+        failures = backup_failures(results)
+        meta = {'db': args.db, 'threads': args.threads, 'rounds': args.rounds, 'pages': args.pages}
+    elif args.mode == 'inprocess':
+        results = run_inprocess(app, endpoints, args.requests, rng)
+        meta = {'db': args.db, 'requests': args.requests}
+    elif args.mode == 'http':
+        with app.app_context():
+            clients = sample_clients()
+        results = run_http(args.url.rstrip('/'), endpoints, args.requests, args.concurrency,
+                           clients, rng, args.email, args.password)
+        meta = {'url': args.url, 'requests': args.requests, 'concurrency': args.concurrency}
+    else:
+        with app.app_context():
+            clients = sample_clients()
+        results = {}
+        for label, url in (('wsgi', args.wsgi_url), ('asgi', args.asgi_url)):
+            print(f"--- {label.upper()} ({url})")
+            results[label] = run_http(url.rstrip('/'), endpoints, args.requests, args.concurrency,
+                                      clients, random.Random(args.seed))
+        compare_results(results['wsgi'], results['asgi'], 'wsgi', 'asgi')
+        meta = {'wsgi_url': args.wsgi_url, 'asgi_url': args.asgi_url,
+                'requests': args.requests, 'concurrency': args.concurrency}
+
+    if not args.no_save:
+        print(f"Resultados guardados en {save_results(args.mode, results, meta)}")
+    if failures:
+        for problem in failures:
+            print(f"FALLO: {problem}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
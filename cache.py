@@ -0,0 +1,121 @@
+# Archivo: cache.py
+"""
+Caché en memoria y limitador de peticiones para las APIs públicas.
+
+- TTLCache: LRU con vencimiento por entrada. Guarda también resultados
+  negativos (None = "no existe") con un vencimiento más corto, para que un bot
+  probando PINs no llegue a la base de datos en cada intento.
+- TokenBucketLimiter: cubeta de tokens por IP. Cada clave ocupa dos números
+  (tokens y último instante), y la cantidad de claves está acotada.
+
+Ambos son por proceso: con varios workers cada uno tiene su copia y el TTL
+acota cuánto puede durar un dato desactualizado.
+"""
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, jsonify
+
+MISSING = object()
+
+
+class TTLCache:
+    """LRU acotado con vencimiento por entrada y caché negativa."""
+    def __init__(self, maxsize=10000, ttl=300, negative_ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Devuelve el valor (None si es negativo) o MISSING si no está o venció."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        ttl = self.negative_ttl if value is None else self.ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TokenBucketLimiter:
+    """
+    Cubeta de tokens por clave: se recargan 'rate' tokens por segundo hasta
+    un máximo de 'burst'. Cada petición consume uno.
+    """
+    def __init__(self, rate=5.0, burst=20, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(self.burst), now]
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    # Se descarta la clave inactiva más antigua
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                return False
+            bucket[0] -= 1
+            return True
+
+
+def _too_many_requests():
+    response = jsonify({'success': False,
+                        'message': 'Demasiadas solicitudes. Espere un momento e intente de nuevo.'})
+    response.status_code = 429
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+def rate_limited(limiter):
+    """Aplica el limitador por IP a una vista (síncrona o asíncrona)."""
+    def decorator(f):
+        if inspect.iscoroutinefunction(f):
+            @wraps(f)
+            async def async_wrapper(*args, **kwargs):
+                if not limiter.allow(request.remote_addr):
+                    return _too_many_requests()
+                return await f(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not limiter.allow(request.remote_addr):
+                return _too_many_requests()
+            return f(*args, **kwargs)
+        return wrapper
+    return decorator
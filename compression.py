@@ -0,0 +1,124 @@
+# Archivo: compression.py
+"""
+Compresión de respuestas y minificación opcional del HTML.
+
+Las plantillas grandes (home, perfil, dashboard) viajan comprimidas con
+brotli (si el paquete 'brotli' está instalado) o gzip, según lo que acepte el
+navegador. Las respuestas en streaming se comprimen por bloques con
+Z_SYNC_FLUSH para no retener datos.
+
+Configuración (app.config):
+    COMPRESS_MIN_SIZE  -> bytes mínimos para comprimir (por defecto 500)
+    COMPRESS_LEVEL     -> nivel gzip 1-9 (por defecto 6)
+    COMPRESS_STREAMS   -> comprimir respuestas en streaming (por defecto True)
+    MINIFY_HTML        -> quitar sangrías y comentarios del HTML (por defecto False)
+"""
+import gzip
+import re
+import zlib
+
+from flask import request, current_app
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él se usa solo gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/calendar', 'text/javascript',
+    'application/json', 'application/javascript', 'application/manifest+json', 'image/svg+xml',
+}
+
+# Bloques cuyo contenido no se toca al minificar
+_PROTECTED = re.compile(r'(<(pre|textarea|script|style)\b.*?</\2\s*>)', re.IGNORECASE | re.DOTALL)
+_COMMENT = re.compile(r'<!--(?!\[if).*?-->', re.DOTALL)
+_INDENT = re.compile(r'[ \t]*\n\s*')
+
+
+def minify_html(html):
+    """
+    Minificación conservadora: elimina comentarios HTML y reduce cada salto de
+    línea con su sangría a un único '\\n'. Como un salto de línea equivale a un
+    espacio en HTML, el resultado se ve igual. <pre>, <textarea>, <script> y
+    <style> se dejan intactos.
+    """
+    parts = _PROTECTED.split(html)
+    out = []
+    # split con dos grupos devuelve: texto, bloque, nombre de etiqueta, texto, ...
+    for i in range(0, len(parts), 3):
+        out.append(_INDENT.sub('\n', _COMMENT.sub('', parts[i])))
+        if i + 1 < len(parts):
+            out.append(parts[i + 1])
+    return ''.join(out)
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _gzip_stream(chunks, level):
+    """Comprime un iterable de bytes sin acumularlo (un flush por bloque)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(response):
+    """Hook after_request: minifica y comprime cuando corresponde."""
+    config = current_app.config
+
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    if response.is_streamed:
+        if not config['COMPRESS_STREAMS'] or not request.accept_encodings['gzip']:
+            return response
+        response.response = _gzip_stream(response.iter_encoded(), config['COMPRESS_LEVEL'])
+        response.headers.pop('Content-Length', None)
+        _mark_encoded(response, 'gzip')
+        return response
+
+    if config['MINIFY_HTML'] and response.mimetype == 'text/html':
+        response.set_data(minify_html(response.get_data(as_text=True)))
+
+    data = response.get_data()
+    response.vary.add('Accept-Encoding')
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    encoding = _choose_encoding()
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=5))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0))
+    else:
+        return response
+    _mark_encoded(response, encoding)
+    return response
+
+
+def _mark_encoded(response, encoding):
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # La representación comprimida no es idéntica byte a byte: ETag débil
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def init_compression(app):
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_STREAMS', True)
+    app.config.setdefault('MINIFY_HTML', False)
+    app.after_request(compress_response)
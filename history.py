@@ -0,0 +1,95 @@
+# Archivo: history.py
+"""
+Historial de reservas de un cliente (activas + archivadas).
+
+Servicio único para /perfil, la revisión del administrador y la edición de
+solicitudes. Pagina por ID ("keyset": id < before_id, orden descendente)
+usando el índice de Reservation.client_id, en lugar de traer todo el
+historial. La primera página de cada cliente se guarda en caché y se invalida
+automáticamente cuando se confirma cualquier cambio en sus reservas.
+"""
+from itertools import chain
+from types import SimpleNamespace
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from archive import RESERVATION_COLUMNS, load_archived, count_archived, merge_history
+from cache import TTLCache, MISSING
+from models import Reservation
+
+PAGE_SIZE = 20
+
+# client_id -> primera página. Por proceso: el TTL corto acota cuánto puede
+# ver otro worker un historial desactualizado.
+history_cache = TTLCache(maxsize=5000, ttl=30)
+
+
+def snapshot(res):
+    """Copia de solo lectura de una reserva (segura para guardar en caché)."""
+    return SimpleNamespace(archived=False, **{c: getattr(res, c) for c in RESERVATION_COLUMNS})
+
+
+def build_page(active, archived, limit):
+    """
+    Une los candidatos activos y archivados (cada lista con hasta limit+1
+    elementos) y devuelve (página, next_before).
+    """
+    merged = merge_history(active, archived)
+    page = merged[:limit]
+    next_before = page[-1].id if len(merged) > limit else None
+    return page, next_before
+
+
+def client_history(client_id, before_id=None, limit=PAGE_SIZE):
+    """
+    Página del historial: {'reservations', 'next_before', 'total'}.
+    'total' solo se calcula para la primera página.
+    """
+    first_page = before_id is None and limit == PAGE_SIZE
+    if first_page:
+        cached = history_cache.get(client_id)
+        if cached is not MISSING:
+            return cached
+
+    query = Reservation.query.filter_by(client_id=client_id)
+    if before_id is not None:
+        query = query.filter(Reservation.id < before_id)
+    active = [snapshot(r) for r in query.order_by(Reservation.id.desc()).limit(limit + 1)]
+    archived = load_archived(client_id, before_id, limit + 1)
+    page, next_before = build_page(active, archived, limit)
+
+    result = {'reservations': page, 'next_before': next_before, 'total': None}
+    if before_id is None:
+        result['total'] = Reservation.query.filter_by(client_id=client_id).count() + count_archived(client_id)
+    if first_page:
+        history_cache.set(client_id, result)
+    return result
+
+
+# ==========================================
+# INVALIDACIÓN AL CONFIRMAR CAMBIOS
+# ==========================================
+# Se anotan los clientes afectados en cada flush y se olvida su caché recién
+# después del commit (si se revierte la transacción, no hay nada que invalidar).
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_clients(session, flush_context):
+    changed = session.info.setdefault('history_changed_clients', set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Reservation) and obj.client_id is not None:
+            changed.add(obj.client_id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_clients(session):
+    for client_id in session.info.pop('history_changed_clients', ()):
+        history_cache.pop(client_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_clients(session):
+    session.info.pop('history_changed_clients', None)
+
+
+def invalidate_history(client_id):
+    """Invalidación explícita para cambios hechos fuera del ORM (ej: SQL directo)."""
+    history_cache.pop(client_id)
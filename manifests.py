@@ -0,0 +1,382 @@
+# Archivo: manifests.py
+"""
+Manifiestos de viaje y calendario ICS por colaborador (chofer).
+
+El despacho asigna cada reserva a un colaborador y una de sus unidades
+(POST /dashboard/assign/<id>). Con eso cada colaborador tiene:
+
+    - Manifiesto del día en HTML (imprimible / "Guardar como PDF" desde el
+      navegador) o JSON: viajes, horarios, clientes, paradas y unidad.
+    - Un calendario ICS al que se suscribe desde el teléfono.
+
+Todo sale de UNA consulta por colaborador (reservas asignadas + cliente +
+unidad + contrato de estudiantes); los viajes de los contratos se expanden con
+Recurrence. El resultado se guarda en caché por colaborador y día y se
+invalida cuando se confirma un cambio en sus reservas. Cada respuesta lleva
+ETag (huella del contenido) y Last-Modified (cuándo cambió por última vez ese
+contenido), así las apps de calendario que consultan cada pocos minutos
+reciben un 304 sin que se regenere nada.
+
+Los enlaces de colaboradores (/colab/<id>/<token>/...) no requieren sesión:
+el token es un HMAC del ID con la SECRET_KEY (y COLLABORATOR_FEED_SALT, que
+permite revocar todos los enlaces cambiándola).
+
+Uso:
+    GET  /dashboard/manifests/<colab_id>?day=AAAA-MM-DD&format=html|json
+    GET  /colab/<colab_id>/<token>/manifest?day=AAAA-MM-DD&format=html|json
+    GET  /colab/<colab_id>/<token>/calendar.ics
+    POST /dashboard/assign/<reservation_id>  collaborator_id=..&bus_id=..
+"""
+import hashlib
+import hmac
+import threading
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+from itertools import chain
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from flask import (Blueprint, Response, abort, current_app, flash, jsonify, redirect,
+                   render_template, request, url_for)
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from audit import record
+from cache import TTLCache, MISSING
+from extensions import db
+from models import Bus, Client, Collaborator, Reservation, StudentSchedule, parse_trip_date
+from schedules import Recurrence
+from users import login_required, admin_required
+
+manifests_bp = Blueprint('manifests', __name__)
+
+FEED_PAST_DAYS = 7
+FEED_DAYS = 60
+TRIP_HOURS = 2          # Duración por defecto de un viaje con hora de salida
+CACHE_TTL = 120         # Acota lo que otro worker puede servir desactualizado
+FEED_REFRESH = 'PT15M'  # Sugerencia de refresco para las apps de calendario
+
+Trip = namedtuple('Trip', 'day last_day reservation_id status service departure_time origin destination '
+                          'pickups institution country seats client_name client_phone bus comments')
+
+# (colaborador, generación, formato, día) -> (cuerpo, etag, last_modified)
+manifest_cache = TTLCache(maxsize=5000, ttl=CACHE_TTL)
+# (colaborador, formato, día) -> (etag, last_modified): conserva la fecha de
+# cambio aunque la entrada se regenere con el mismo contenido
+_stamps = TTLCache(maxsize=20000, ttl=7 * 86400)
+_generations = {}
+_generation_lock = threading.Lock()
+
+
+# ==========================================
+# 1. VIAJES ASIGNADOS (UNA CONSULTA)
+# ==========================================
+def assigned_trips(collaborator_id, start, end):
+    """Viajes del colaborador que se cruzan con [start, end], ordenados por día y hora."""
+    rows = db.session.query(
+        Reservation.id, Reservation.status, Reservation.service_category, Reservation.date,
+        Reservation.return_date, Reservation.departure_time, Reservation.origin,
+        Reservation.destination, Reservation.needs_pickup, Reservation.pickup_locations,
+        Reservation.institution_name, Reservation.country, Reservation.capacity_needed,
+        Reservation.comments, Client.name, Client.last_name1, Client.phone,
+        Bus.brand, Bus.plate, Bus.capacity, StudentSchedule,
+    ).outerjoin(Client, Reservation.client_id == Client.id)\
+     .outerjoin(Bus, Reservation.bus_id == Bus.id)\
+     .outerjoin(StudentSchedule, StudentSchedule.reservation_id == Reservation.id)\
+     .filter(Reservation.collaborator_id == collaborator_id, Reservation.status != 'Cancelada')
+
+    trips = []
+    for (res_id, status, service, day_str, return_str, departure, origin, destination, needs_pickup,
+         pickups, institution, country, seats, comments, first_name, last_name, phone,
+         brand, plate, bus_capacity, schedule) in rows:
+        bus = f"{brand or ''} {plate or ''}".strip() + (f" ({bus_capacity} asientos)" if bus_capacity else '')
+        common = dict(reservation_id=res_id, status=status, service=service, departure_time=departure or '',
+                      origin=origin or '', destination=destination or '',
+                      pickups=(pickups or '') if needs_pickup else '', institution=institution or '',
+                      country=country or '', seats=seats or 0,
+                      client_name=f"{first_name} {last_name}" if first_name else '',
+                      client_phone=phone or '', bus=bus or None, comments=comments or '')
+        if schedule is not None:
+            days = Recurrence.from_schedule(schedule).between(start, end)
+            trips.extend(Trip(day=d, last_day=d, **common) for d in days)
+            continue
+        first = parse_trip_date(day_str)
+        if first is None:
+            continue
+        last = max(parse_trip_date(return_str) or first, first)
+        if first <= end and last >= start:
+            trips.append(Trip(day=first, last_day=last, **common))
+    trips.sort(key=lambda t: (t.day, t.departure_time, t.reservation_id))
+    return trips
+
+
+# ==========================================
+# 2. CACHÉ POR COLABORADOR Y DÍA
+# ==========================================
+def _generation(collaborator_id):
+    return _generations.get(None, 0), _generations.get(collaborator_id, 0)
+
+def invalidate_collaborator(collaborator_id=None):
+    """Olvida la caché de un colaborador (None: de todos)."""
+    with _generation_lock:
+        _generations[collaborator_id] = _generations.get(collaborator_id, 0) + 1
+
+def cached_render(collaborator, fmt, day, build, render):
+    """
+    (cuerpo, etag, last_modified) de la caché o generados con
+    render(build(), last_modified). El ETag es la huella de los datos, así que
+    dos generaciones con los mismos viajes dan la misma respuesta.
+    """
+    collaborator_id = collaborator.id
+    key = (collaborator_id, _generation(collaborator_id), fmt, day)
+    entry = manifest_cache.get(key)
+    if entry is not MISSING:
+        return entry
+
+    data = build()
+    fingerprint = (fmt, collaborator_name(collaborator), collaborator.mobile, data)
+    etag = hashlib.sha1(repr(fingerprint).encode('utf-8')).hexdigest()
+    stamp_key = (collaborator_id, fmt, day)
+    previous = _stamps.get(stamp_key)
+    if previous is not MISSING and previous[0] == etag:
+        last_modified = previous[1]
+    else:
+        last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        _stamps.set(stamp_key, (etag, last_modified))
+    entry = (render(data, last_modified), etag, last_modified)
+    manifest_cache.set(key, entry)
+    return entry
+
+def conditional_response(entry, mimetype, max_age=60):
+    """Respuesta con ETag/Last-Modified; 304 si el cliente ya tiene esta versión."""
+    body, etag, last_modified = entry
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+
+# Se anotan los colaboradores afectados en cada flush y se invalida su caché
+# recién después del commit (mismo esquema que history.py)
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_collaborators(session, flush_context):
+    changed = session.info.setdefault('manifest_changed', set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Reservation):
+            history = inspect(obj).attrs.collaborator_id.history
+            changed.update(c for c in chain(history.deleted, [obj.collaborator_id]) if c is not None)
+        elif isinstance(obj, (StudentSchedule, Bus, Collaborator, Client)):
+            changed.add(None)  # Poco frecuentes: se invalida todo
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_collaborators(session):
+    for collaborator_id in session.info.pop('manifest_changed', ()):
+        invalidate_collaborator(collaborator_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_collaborators(session):
+    session.info.pop('manifest_changed', None)
+
+
+# ==========================================
+# 3. FORMATOS: JSON, HTML E ICS
+# ==========================================
+def feed_token(collaborator):
+    """
+    Token de los enlaces públicos. Incluye el secreto propio del colaborador,
+    así un id reutilizado no hereda los enlaces del anterior (las filas
+    anteriores a la columna lo reciben en app.upgrade_schema).
+    """
+    salt = current_app.config.get('COLLABORATOR_FEED_SALT', 'colab-feed')
+    message = f"{salt}:{collaborator.id}:{collaborator.feed_secret}".encode('utf-8')
+    return hmac.new(current_app.config['SECRET_KEY'].encode('utf-8'), message, hashlib.sha256).hexdigest()[:32]
+
+def feed_links(collaborator):
+    token = feed_token(collaborator)
+    return {
+        'manifest': url_for('manifests.collaborator_manifest', colab_id=collaborator.id, token=token,
+                            _external=True),
+        'ics': url_for('manifests.collaborator_calendar', colab_id=collaborator.id, token=token,
+                       _external=True),
+    }
+
+def trip_dict(trip):
+    data = trip._asdict()
+    data['day'], data['last_day'] = trip.day.isoformat(), trip.last_day.isoformat()
+    return data
+
+def render_manifest(collaborator, day, fmt):
+    """Manifiesto del día (cuerpo, etag, last_modified) en 'json' o 'html'."""
+    def render(trips, last_modified):
+        if fmt == 'json':
+            return current_app.json.dumps({
+                'success': True, 'collaborator': {'id': collaborator.id, 'name': collaborator_name(collaborator),
+                                                  'mobile': collaborator.mobile},
+                'day': day.isoformat(), 'seats': sum(t.seats for t in trips),
+                'trips': [trip_dict(t) for t in trips], 'links': feed_links(collaborator),
+            })
+        return render_template('manifest.html', collaborator=collaborator, name=collaborator_name(collaborator),
+                               day=day, trips=trips, links=feed_links(collaborator),
+                               generated=last_modified, one_day=timedelta(days=1))
+    return cached_render(collaborator, fmt, day, lambda: assigned_trips(collaborator.id, day, day), render)
+
+def collaborator_name(collaborator):
+    return ' '.join(p for p in (collaborator.name, collaborator.last_name1, collaborator.last_name2) if p)
+
+
+def local_timezone():
+    try:
+        return ZoneInfo(current_app.config.get('TIMEZONE', 'America/Costa_Rica'))
+    except ZoneInfoNotFoundError:
+        return timezone(timedelta(hours=-6))  # Costa Rica no usa horario de verano
+
+def ics_escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def ics_fold(line):
+    """Parte las líneas de más de 75 octetos (RFC 5545 §3.1)."""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts, limit = [], 75
+    while data:
+        cut = min(limit, len(data))
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:  # no cortar un carácter UTF-8
+            cut -= 1
+        parts.append(data[:cut].decode('utf-8'))
+        data, limit = data[cut:], 74  # las continuaciones empiezan con un espacio
+    return '\r\n '.join(parts)
+
+def trip_event(trip, stamp, tz):
+    """Líneas VEVENT de un viaje: con hora si la tiene y dura un día, si no de día completo."""
+    summary = trip.institution or f"{trip.origin} → {trip.destination}"
+    details = [
+        f"Reserva #{trip.reservation_id} ({trip.service}, {trip.status})",
+        f"Cliente: {trip.client_name} {trip.client_phone}".rstrip() if trip.client_name else '',
+        f"Pasajeros: {trip.seats}",
+        f"Unidad: {trip.bus}" if trip.bus else '',
+        f"Ruta: {trip.origin} → {trip.destination}",
+        f"Paradas: {trip.pickups}" if trip.pickups else '',
+        f"País: {trip.country}" if trip.country and trip.last_day != trip.day else '',
+        f"Notas: {trip.comments}" if trip.comments else '',
+    ]
+    lines = ['BEGIN:VEVENT',
+             f"UID:res-{trip.reservation_id}-{trip.day:%Y%m%d}@transavi-cr",
+             f"DTSTAMP:{stamp:%Y%m%dT%H%M%SZ}"]
+    try:
+        departure = datetime.strptime(trip.departure_time, '%H:%M').time()
+    except ValueError:
+        departure = None
+    if departure is not None and trip.day == trip.last_day:
+        start = datetime.combine(trip.day, departure, tz).astimezone(timezone.utc)
+        lines += [f"DTSTART:{start:%Y%m%dT%H%M%SZ}",
+                  f"DTEND:{start + timedelta(hours=TRIP_HOURS):%Y%m%dT%H%M%SZ}"]
+    else:
+        lines += [f"DTSTART;VALUE=DATE:{trip.day:%Y%m%d}",
+                  f"DTEND;VALUE=DATE:{trip.last_day + timedelta(days=1):%Y%m%d}"]
+    lines += [f"SUMMARY:{ics_escape(summary)}",
+              f"LOCATION:{ics_escape(trip.origin)}",
+              f"DESCRIPTION:{ics_escape(chr(10).join(d for d in details if d))}",
+              f"STATUS:{'CONFIRMED' if trip.status in ('Aprobada', 'Revisado') else 'TENTATIVE'}",
+              'END:VEVENT']
+    return lines
+
+def render_calendar(collaborator, today):
+    """Calendario ICS (cuerpo, etag, last_modified) desde FEED_PAST_DAYS atrás hasta FEED_DAYS adelante."""
+    start, end = today - timedelta(days=FEED_PAST_DAYS), today + timedelta(days=FEED_DAYS)
+
+    def render(trips, last_modified):
+        tz = local_timezone()
+        lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//TRANSAVI C.R.//Manifiestos//ES',
+                 'CALSCALE:GREGORIAN', 'METHOD:PUBLISH',
+                 f"X-WR-CALNAME:{ics_escape('Viajes - ' + collaborator_name(collaborator))}",
+                 f"REFRESH-INTERVAL;VALUE=DURATION:{FEED_REFRESH}", f"X-PUBLISHED-TTL:{FEED_REFRESH}"]
+        for trip in trips:
+            lines.extend(trip_event(trip, last_modified, tz))
+        lines.append('END:VCALENDAR')
+        return '\r\n'.join(ics_fold(line) for line in lines) + '\r\n'
+
+    return cached_render(collaborator, 'ics', today,
+                         lambda: assigned_trips(collaborator.id, start, end), render)
+
+
+# ==========================================
+# 4. ENDPOINTS
+# ==========================================
+def _manifest_response(collaborator):
+    day = parse_trip_date(request.args.get('day')) or date.today()
+    fmt = 'json' if request.args.get('format') == 'json' else 'html'
+    entry = render_manifest(collaborator, day, fmt)
+    return conditional_response(entry, 'application/json' if fmt == 'json' else 'text/html')
+
+def _collaborator_from_token(colab_id, token):
+    collaborator = Collaborator.query.get_or_404(colab_id)
+    # Se comparan bytes: compare_digest rechaza str con caracteres no ASCII
+    if not hmac.compare_digest(token.encode('utf-8'), feed_token(collaborator).encode('utf-8')):
+        abort(404)
+    return collaborator
+
+@manifests_bp.route('/dashboard/manifests/<int:colab_id>')
+@login_required
+def dashboard_manifest(colab_id):
+    return _manifest_response(Collaborator.query.get_or_404(colab_id))
+
+@manifests_bp.route('/colab/<int:colab_id>/<string:token>/manifest')
+def collaborator_manifest(colab_id, token):
+    return _manifest_response(_collaborator_from_token(colab_id, token))
+
+@manifests_bp.route('/colab/<int:colab_id>/<string:token>/calendar.ics')
+def collaborator_calendar(colab_id, token):
+    collaborator = _collaborator_from_token(colab_id, token)
+    response = conditional_response(render_calendar(collaborator, date.today()), 'text/calendar', max_age=300)
+    response.headers['Content-Disposition'] = f'inline; filename="viajes-{colab_id}.ics"'
+    return response
+
+@manifests_bp.route('/dashboard/assign/<int:id>', methods=['POST'])
+@login_required
+@admin_required
+def assign_reservation(id):
+    """
+    Asigna la reserva a un colaborador y una de sus unidades (collaborator_id
+    vacío la desasigna). Si el colaborador tiene una sola unidad se usa esa.
+    """
+    res = Reservation.query.get_or_404(id)
+    data = request.get_json(silent=True) or request.form
+    wants_json = request.is_json
+
+    def fail(message):
+        if wants_json:
+            return jsonify({'success': False, 'message': message}), 400
+        flash(message, 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    try:
+        collaborator_id = int(data['collaborator_id']) if data.get('collaborator_id') else None
+        bus_id = int(data['bus_id']) if data.get('bus_id') else None
+    except (TypeError, ValueError):
+        return fail('Colaborador o unidad inválidos.')
+
+    if collaborator_id is None:
+        bus_id = None
+    else:
+        collaborator = db.session.get(Collaborator, collaborator_id)
+        if collaborator is None:
+            return fail('El colaborador no existe.')
+        bus_ids = [bus.id for bus in collaborator.buses]
+        if bus_id is None and len(bus_ids) == 1:
+            bus_id = bus_ids[0]
+        if bus_id is not None and bus_id not in bus_ids:
+            return fail('La unidad no pertenece al colaborador.')
+
+    record('reservation', res.id, 'assign', {
+        'from': {'collaborator_id': res.collaborator_id, 'bus_id': res.bus_id},
+        'to': {'collaborator_id': collaborator_id, 'bus_id': bus_id}})
+    res.collaborator_id, res.bus_id = collaborator_id, bus_id
+    db.session.commit()
+
+    if wants_json:
+        return jsonify({'success': True, 'id': res.id, 'collaborator_id': collaborator_id, 'bus_id': bus_id})
+    flash(f"Reserva #{res.id} asignada." if collaborator_id else f"Reserva #{res.id} sin asignar.", 'success')
+    return redirect(url_for('main.dashboard'))
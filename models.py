@@ -1,4 +1,6 @@
 # Archivo: models.py
+import secrets
+from datetime import date
 from extensions import db
 
 # NOTA: El modelo 'User' se encuentra en 'users.py' (anteriormente admin.py)
@@ -19,10 +21,21 @@ class Client(db.Model):
     # Relación con reservas
     reservations = db.relationship('Reservation', backref='client', lazy=True)
 
+    # Teléfono y email identifican al cliente: índices únicos para que la
+    # resolución de /reserve sea una sola consulta y el alta no pueda duplicarse
+    __table_args__ = (
+        db.Index('ux_client_phone', 'phone', unique=True),
+        db.Index('ux_client_email', 'email', unique=True),
+    )
+
 class Collaborator(db.Model):
     """
     Modelo para los colaboradores (choferes/transportistas).
     """
+    # AUTOINCREMENT: un id borrado no se reutiliza, así los enlaces de manifiesto
+    # de un colaborador eliminado no sirven para el siguiente
+    __table_args__ = {'sqlite_autoincrement': True}
+
     id = db.Column(db.Integer, primary_key=True)
     photo = db.Column(db.String(255))
     name = db.Column(db.String(50))
@@ -33,6 +46,7 @@ class Collaborator(db.Model):
     email = db.Column(db.String(100))
     license_type = db.Column(db.String(50))
     ownership = db.Column(db.String(20)) 
+    feed_secret = db.Column(db.String(32), default=lambda: secrets.token_hex(16))  # Firma sus enlaces de manifiesto
     buses = db.relationship('Bus', backref='owner', lazy=True, cascade="all, delete-orphan")
 
 class Bus(db.Model):
@@ -53,7 +67,7 @@ class Reservation(db.Model):
     """
     id = db.Column(db.Integer, primary_key=True)
     # Relación con el Cliente
-    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=True, index=True)
     
     date = db.Column(db.String(20)) # Usado como Fecha de Salida
     origin = db.Column(db.String(255))
@@ -80,6 +94,67 @@ class Reservation(db.Model):
     return_date = db.Column(db.String(20))   # Fecha de regreso
     trip_duration = db.Column(db.Integer)    # Cantidad de días
 
+    # Cotización (pricing.py)
+    distance_km = db.Column(db.Float, nullable=True)     # Distancia estimada por el administrador
+    quote_amount = db.Column(db.Integer, nullable=True)  # Monto cotizado en colones
+    quote_version = db.Column(db.Integer, nullable=True) # Versión de la tabla de tarifas usada
+
+    # Asignación del viaje (manifests.py)
+    collaborator_id = db.Column(db.Integer, db.ForeignKey('collaborator.id'), nullable=True, index=True)
+    bus_id = db.Column(db.Integer, db.ForeignKey('bus.id'), nullable=True)
+
+    # Los IDs no se reutilizan: las reservas archivadas conservan el suyo (archive.py)
+    __table_args__ = {'sqlite_autoincrement': True}
+
+class StudentSchedule(db.Model):
+    """
+    Recurrencia de un contrato de Transporte de Estudiantes.
+    Se guarda una sola vez por contrato (la reserva original); los viajes de
+    cada día se calculan bajo demanda en schedules.py.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    reservation_id = db.Column(db.Integer, db.ForeignKey('reservation.id'), unique=True, nullable=False)
+    weekdays = db.Column(db.Integer, nullable=False)        # Máscara de bits: 1 = lunes ... 64 = domingo
+    term_start = db.Column(db.String(10), nullable=False)   # AAAA-MM-DD
+    term_end = db.Column(db.String(10), nullable=False, index=True)
+    holidays = db.Column(db.Text)                           # Fechas AAAA-MM-DD separadas por coma
+
+    reservation = db.relationship('Reservation', backref=db.backref(
+        'schedule', uselist=False, cascade='all, delete-orphan'))
+
+def parse_trip_date(value):
+    """
+    Convierte Reservation.date a datetime.date.
+    Formatos de los formularios: 'D-M-AAAA' (listas desplegables) y 'AAAA-MM-DD'
+    (input type=date de viajes internacionales). Devuelve None para 'Pendiente'
+    u otros valores no reconocidos.
+    """
+    if not value:
+        return None
+    parts = value.split('-')
+    if len(parts) != 3 or not all(p.isdigit() for p in parts):
+        return None
+    try:
+        if len(parts[0]) == 4:
+            return date(int(parts[0]), int(parts[1]), int(parts[2]))
+        return date(int(parts[2]), int(parts[1]), int(parts[0]))
+    except ValueError:
+        return None
+
+class DemandRollup(db.Model):
+    """
+    Resumen diario de demanda por categoría de servicio.
+    Lo recalcula desde Reservation la tarea 'update_rollups' (tasks.py) tras
+    cada cambio confirmado de una reserva; no cuenta las canceladas.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.String(20), nullable=False)      # Mismo formato que Reservation.date
+    service_category = db.Column(db.String(50), nullable=False)
+    reservations = db.Column(db.Integer, default=0)
+    seats = db.Column(db.Integer, default=0)
+
+    __table_args__ = (db.UniqueConstraint('day', 'service_category'),)
+
 class AboutUs(db.Model):
     """
     Modelo para la información de contacto y configuración de la empresa.
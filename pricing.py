@@ -0,0 +1,310 @@
+# Archivo: pricing.py
+"""
+Motor de cotizaciones.
+
+Las tarifas viven en instance/rates.json (si no existe se usan DEFAULT_RATES)
+y se compilan una sola vez en una RateTable: un diccionario categoría ->
+índice, una tupla de parámetros por categoría y los tramos de asientos como
+listas ordenadas para buscar con bisect. Cotizar una reserva es entonces
+aritmética sobre valores ya resueltos (microsegundos).
+
+Cuando cambian las tarifas (o su 'version'), reprice_pending() recalcula todas
+las reservas pendientes en lote: una consulta, cálculo vectorizado con NumPy
+(opcional; sin él se cotiza fila por fila) y un UPDATE masivo por ID.
+
+Fórmula:
+    (base + por_km * km + por_día * días) * factor_del_tramo_de_asientos
+    + recargo_por_parada * paradas
+    internacional: * (1 + recargo_internacional) + recargo_del_país
+    redondeado a 'rounding' colones
+
+Uso:
+    python pricing.py init        -> escribe instance/rates.json con las tarifas por defecto
+    python pricing.py reprice     -> recotiza las reservas pendientes
+    python pricing.py quote 42    -> cotiza (y guarda) la reserva 42
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import or_, update
+
+from extensions import db
+from models import Reservation
+from users import login_required, admin_required
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional; sin él el recálculo masivo es fila por fila
+    np = None
+
+pricing_bp = Blueprint('pricing', __name__)
+
+DEFAULT_RATES = {
+    'version': 1,
+    'currency': 'CRC',
+    'rounding': 100,
+    'default_km': 40,
+    'default_category': 'Servicios Especiales',
+    'categories': {
+        'Transporte de Estudiantes': {'base': 15000, 'per_km': 650, 'per_day': 0},
+        'Servicios Especiales': {'base': 25000, 'per_km': 800, 'per_day': 35000},
+        'Viajes Internacionales': {'base': 150000, 'per_km': 950, 'per_day': 85000, 'international': True},
+    },
+    # [desde N asientos, factor]
+    'seat_tiers': [[0, 1.0], [16, 1.25], [30, 1.6], [45, 2.0]],
+    'pickup_surcharge': 5000,
+    'international_surcharge': 0.15,
+    'country_surcharge': {'Panamá': 60000, 'Nicaragua': 40000, 'El Salvador': 90000,
+                          'Honduras': 80000, 'Guatemala': 110000, 'México': 250000},
+}
+
+# ==========================================
+# 1. TABLA DE TARIFAS COMPILADA
+# ==========================================
+class RateTable:
+    """Tarifas resueltas a estructuras de búsqueda directa."""
+    def __init__(self, rates):
+        self.rates = rates
+        self.version = int(rates.get('version', 1))
+        self.rounding = rates.get('rounding', 100) or 1
+        self.default_km = float(rates.get('default_km', 0))
+        self.pickup_fee = float(rates.get('pickup_surcharge', 0))
+        self.international_rate = float(rates.get('international_surcharge', 0))
+        self.country_fees = {k: float(v) for k, v in rates.get('country_surcharge', {}).items()}
+
+        categories = rates['categories']
+        self.category_index = {name: i for i, name in enumerate(categories)}
+        self.default_index = self.category_index.get(rates.get('default_category'), 0)
+        # (base, por_km, por_día, internacional) por categoría
+        self.category_params = [
+            (float(c.get('base', 0)), float(c.get('per_km', 0)), float(c.get('per_day', 0)),
+             1.0 if c.get('international') else 0.0)
+            for c in categories.values()
+        ]
+
+        tiers = sorted(rates.get('seat_tiers') or [[0, 1.0]])
+        self.tier_seats = [int(t[0]) for t in tiers]
+        self.tier_factors = [float(t[1]) for t in tiers]
+
+    def seat_factor(self, seats):
+        return self.tier_factors[max(bisect_right(self.tier_seats, seats) - 1, 0)]
+
+    def price(self, category, seats, days, km, stops, country):
+        """Cotización a partir de valores ya normalizados (ver quote_values)."""
+        base, per_km, per_day, international = self.category_params[
+            self.category_index.get(category, self.default_index)]
+        amount = (base + per_km * km + per_day * days) * self.seat_factor(seats)
+        amount += self.pickup_fee * stops
+        if international:
+            amount = amount * (1 + self.international_rate) + self.country_fees.get(country, 0.0)
+        return int(round(amount / self.rounding)) * self.rounding
+
+
+def pickup_stops(needs_pickup, pickup_locations):
+    """Paradas de recogida: una por elemento de la lista (mínimo una si se pidió)."""
+    if not needs_pickup:
+        return 0
+    if not pickup_locations:
+        return 1
+    parts = pickup_locations.replace(';', ',').replace('\n', ',').split(',')
+    return max(sum(1 for p in parts if not p.isspace() and p), 1)
+
+def quote_values(table, category, seats, days, km, needs_pickup, pickup_locations, country):
+    """Normaliza los campos de la reserva (nulos, mínimos) y cotiza."""
+    return table.price(category, seats or 0, max(days or 1, 1),
+                       table.default_km if km is None else km,
+                       pickup_stops(needs_pickup, pickup_locations), country)
+
+
+# ==========================================
+# 2. CARGA DE TARIFAS
+# ==========================================
+_loaded = {}
+_load_lock = threading.Lock()
+
+def rates_path():
+    return current_app.config.get('RATES_PATH') or os.path.join(current_app.instance_path, 'rates.json')
+
+def get_rates():
+    """
+    RateTable vigente; se recompila solo si rates.json cambió.
+    Si el archivo está mal formado (o a medio escribir) se registra el error y
+    se sigue cotizando con la última tabla válida (o DEFAULT_RATES): un error
+    de tipeo en las tarifas no debe tumbar el formulario de reservas.
+    """
+    path = rates_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    cached = _loaded.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with _load_lock:
+        try:
+            if mtime is None:
+                rates = DEFAULT_RATES
+            else:
+                with open(path, encoding='utf-8') as f:
+                    rates = json.load(f)
+            table = RateTable(rates)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            current_app.logger.error("Tarifas inválidas en %s (%s); se usan las anteriores.", path, e)
+            table = cached[1] if cached else RateTable(DEFAULT_RATES)
+        # Se recuerda el mtime aun si falló: no se reintenta hasta que el archivo cambie
+        _loaded[path] = (mtime, table)
+    return table
+
+
+# ==========================================
+# 3. COTIZACIÓN INDIVIDUAL Y EN LOTE
+# ==========================================
+QUOTE_COLUMNS = (Reservation.service_category, Reservation.capacity_needed, Reservation.trip_duration,
+                 Reservation.distance_km, Reservation.needs_pickup, Reservation.pickup_locations,
+                 Reservation.country)
+
+def apply_quote(res, table=None):
+    """Cotiza una reserva y guarda el monto en ella (el commit lo hace quien llama)."""
+    table = table or get_rates()
+    res.quote_amount = quote_values(table, *(getattr(res, c.key) for c in QUOTE_COLUMNS))
+    res.quote_version = table.version
+    return res.quote_amount
+
+
+def quote_batch(table, rows):
+    """
+    Cotiza muchas filas (tuplas en el orden de QUOTE_COLUMNS).
+    Con NumPy la aritmética es vectorizada; el resultado es idéntico a quote_values.
+    """
+    if np is None:
+        return [quote_values(table, *row) for row in rows]
+    if not rows:
+        return []
+
+    # Transpuesta por listas: zip(*rows) crea una tupla por fila y dispara el GC
+    categories, seats, days, km, needs_pickup, pickups, countries = (
+        [row[i] for row in rows] for i in range(len(QUOTE_COLUMNS)))
+    index, default = table.category_index, table.default_index
+    params = np.array(table.category_params, dtype=np.float64)
+    base, per_km, per_day, international = params[[index.get(c, default) for c in categories]].T
+
+    # Con dtype float los None quedan como NaN y se reemplazan en bloque
+    seats = np.nan_to_num(np.array(seats, dtype=np.float64), nan=0.0)
+    days = np.maximum(np.nan_to_num(np.array(days, dtype=np.float64), nan=1.0), 1)
+    km = np.nan_to_num(np.array(km, dtype=np.float64), nan=table.default_km)
+    # Paradas y país solo se revisan en las filas que los usan
+    stops = np.zeros(len(rows))
+    for i in np.flatnonzero(np.array(needs_pickup, dtype=bool)).tolist():
+        stops[i] = pickup_stops(True, pickups[i])
+    is_international = international > 0
+    country_fee = np.zeros(len(rows))
+    for i in np.flatnonzero(is_international).tolist():
+        country_fee[i] = table.country_fees.get(countries[i], 0.0)
+
+    tier = np.maximum(np.searchsorted(table.tier_seats, seats, side='right') - 1, 0)
+    factors = np.asarray(table.tier_factors, dtype=np.float64)[tier]
+
+    amount = (base + per_km * km + per_day * days) * factors
+    amount += table.pickup_fee * stops
+    amount = np.where(is_international, amount * (1 + table.international_rate) + country_fee, amount)
+    return (np.round(amount / table.rounding).astype(np.int64) * table.rounding).tolist()
+
+
+def reprice_pending(force=False):
+    """
+    Recotiza las reservas pendientes cuya cotización es de otra versión de
+    tarifas (o todas con force=True). Devuelve la cantidad actualizada.
+    """
+    table = get_rates()
+    query = db.session.query(Reservation.id, *QUOTE_COLUMNS).filter(Reservation.status == 'Pendiente')
+    if not force:
+        query = query.filter(or_(Reservation.quote_version.is_(None),
+                                 Reservation.quote_version != table.version))
+    rows = query.all()
+    if not rows:
+        return 0
+    amounts = quote_batch(table, [row[1:] for row in rows])
+    # UPDATE masivo por clave primaria (executemany, sin cargar objetos)
+    db.session.execute(update(Reservation), [
+        {'id': row[0], 'quote_amount': amount, 'quote_version': table.version}
+        for row, amount in zip(rows, amounts)
+    ])
+    db.session.commit()
+    return len(rows)
+
+
+# ==========================================
+# 4. ENDPOINTS DE ADMINISTRACIÓN
+# ==========================================
+@pricing_bp.route('/dashboard/pricing/rates')
+@login_required
+def show_rates():
+    table = get_rates()
+    return jsonify({'success': True, 'version': table.version, 'rates': table.rates})
+
+@pricing_bp.route('/dashboard/pricing/reprice', methods=['POST'])
+@login_required
+@admin_required
+def reprice():
+    """Recotiza las pendientes con las tarifas actuales (?force=1 para todas)."""
+    started = time.perf_counter()
+    updated = reprice_pending(force=request.args.get('force') == '1')
+    return jsonify({'success': True, 'updated': updated, 'version': get_rates().version,
+                    'seconds': round(time.perf_counter() - started, 3)})
+
+@pricing_bp.route('/dashboard/pricing/<int:id>', methods=['POST'])
+@login_required
+@admin_required
+def quote_reservation(id):
+    """Registra la distancia estimada de una reserva y la recotiza."""
+    res = Reservation.query.get_or_404(id)
+    data = request.get_json(silent=True) or request.form
+    if data.get('distance_km') not in (None, ''):
+        try:
+            distance = float(data['distance_km'])
+        except (TypeError, ValueError):
+            distance = -1
+        if distance < 0:
+            return jsonify({'success': False, 'message': 'Distancia inválida.'}), 400
+        res.distance_km = distance
+    amount = apply_quote(res)
+    db.session.commit()
+    return jsonify({'success': True, 'id': res.id, 'distance_km': res.distance_km,
+                    'quote_amount': amount, 'quote_version': res.quote_version})
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Tarifas y cotizaciones de reservas.")
+    parser.add_argument('command', choices=['init', 'reprice', 'quote'])
+    parser.add_argument('id', nargs='?', type=int, help="ID de la reserva (para 'quote')")
+    parser.add_argument('--force', action='store_true', help="Recotizar aunque la versión no haya cambiado")
+    parser.add_argument('--db', help="URI de la base de datos (por defecto la de la app)")
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.db} if args.db else None)
+    with app.app_context():
+        if args.command == 'init':
+            path = rates_path()
+            if os.path.exists(path):
+                raise SystemExit(f"{path} ya existe; edítelo y suba 'version' para recotizar.")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(DEFAULT_RATES, f, indent=2, ensure_ascii=False)
+            print(f"Tarifas escritas en {path}")
+        elif args.command == 'reprice':
+            started = time.perf_counter()
+            updated = reprice_pending(force=args.force)
+            print(f"Reservas recotizadas: {updated} en {time.perf_counter() - started:.2f}s")
+        else:
+            res = db.session.get(Reservation, args.id)
+            if res is None:
+                raise SystemExit(f"No existe la reserva {args.id}")
+            amount = apply_quote(res)
+            db.session.commit()
+            print(f"Reserva #{res.id}: ₡{amount:,}")
@@ -1,17 +1,20 @@
 # Archivo: profile.py
-from flask import Blueprint, render_template, request, flash
-from models import Client, Reservation
+from flask import Blueprint, render_template, request, flash, jsonify
+from models import Client
+from history import client_history
+from cache import TokenBucketLimiter, rate_limited
 
 # Definimos el Blueprint para el perfil
 profile_bp = Blueprint('profile', __name__)
 
+# "Cargar más" del historial: mismo ritmo que las otras APIs públicas por PIN
+history_limiter = TokenBucketLimiter(rate=5, burst=20)
+
 @profile_bp.route('/perfil', methods=['GET', 'POST'])
 def my_requests():
     """
     Vista donde el cliente ingresa su PIN para ver sus solicitudes.
     """
-    client = None
-    reservations = []
     pin_searched = ""
     
     if request.method == 'POST':
@@ -20,14 +23,52 @@ def my_requests():
         if pin_searched:
             client = Client.query.filter_by(pin=pin_searched).first()
             if client:
-                # Obtener reservas ordenadas por ID descendente (las más nuevas primero)
-                reservations = Reservation.query.filter_by(client_id=client.id)\
-                                                .order_by(Reservation.id.desc()).all()
-                if not reservations:
-                    flash("Hola " + client.name + ", aún no tienes solicitudes registradas.", "info")
-            else:
-                flash("No se encontró ningún cliente con ese PIN. Verifica e intenta de nuevo.", "danger")
-        else:
-            flash("Por favor ingresa un PIN.", "warning")
+                history = client_history(client.id)
+                flash_search_result(pin_searched, client.name, history['reservations'])
+                return render_profile(client, pin_searched, history)
+        flash_search_result(pin_searched, None, [])
             
-    return render_template('perfil.html', client=client, reservations=reservations, pin=pin_searched)
\ No newline at end of file
+    return render_template('perfil.html', client=None, reservations=[], pin=pin_searched)
+
+def render_profile(client, pin, history=None):
+    """
+    Perfil del cliente con la primera página de su historial (activas + archivadas).
+    También lo usan la revisión del administrador y la edición de solicitudes.
+    """
+    if history is None:
+        history = client_history(client.id)
+    return render_template('perfil.html', client=client, pin=pin,
+                           reservations=history['reservations'],
+                           next_before=history['next_before'],
+                           total=history['total'])
+
+@profile_bp.route('/api/history/<string:pin>')
+@rate_limited(history_limiter)
+def more_history(pin):
+    """
+    Páginas siguientes del historial ("Cargar más" en /perfil).
+    Devuelve las tarjetas ya renderizadas y el ID desde donde seguir.
+    """
+    before = request.args.get('before', type=int)
+    client = Client.query.filter_by(pin=pin.strip().upper()).first()
+    if not client or before is None:
+        return jsonify({'success': False, 'message': 'Solicitud inválida.'}), 404
+    history = client_history(client.id, before_id=before)
+    return jsonify({
+        'success': True,
+        'html': render_template('_reservation_cards.html', client=client, pin=client.pin,
+                                reservations=history['reservations']),
+        'next_before': history['next_before'],
+    })
+
+def flash_search_result(pin_searched, client_name, reservations):
+    """
+    Mensajes de la búsqueda por PIN.
+    Compartido con la versión asíncrona de /perfil (asgi.py).
+    """
+    if not pin_searched:
+        flash("Por favor ingresa un PIN.", "warning")
+    elif client_name is None:
+        flash("No se encontró ningún cliente con ese PIN. Verifica e intenta de nuevo.", "danger")
+    elif not reservations:
+        flash("Hola " + client_name + ", aún no tienes solicitudes registradas.", "info")
@@ -0,0 +1,355 @@
+# Archivo: profiler.py
+"""
+Perfilador por muestreo bajo demanda (solo administradores).
+
+Un hilo aparte lee cada INTERVAL_MS la pila de los hilos que están atendiendo
+peticiones (sys._current_frames) y cuenta las pilas repetidas; la petición en
+sí no se instrumenta, así que lo que se mide es el tiempo real por función.
+
+Dos modos:
+    por duración   -> muestrea durante 'seconds' segundos (todas las rutas o
+                      solo 'route').
+    por peticiones -> muestrea las próximas 'requests' peticiones a 'route'
+                      (ruta '/reserve' o endpoint 'main.dashboard').
+
+En ambos la sesión termina como máximo a los MAX_SECONDS segundos
+(PROFILER_MAX_SECONDS en app.config), aunque no hayan llegado las peticiones.
+Sin sesión activa no hay hilo de muestreo y los hooks de petición solo hacen
+una lectura de diccionario, así que el costo en producción es despreciable.
+
+El resultado se entrega como pilas colapsadas ('a;b;c 12', el formato que
+usan flamegraph.pl y speedscope) y un resumen con las funciones, consultas
+SQL y bloques de plantilla donde más muestras cayeron.
+
+Cada worker tiene su propio perfilador: con varios procesos, la sesión solo
+ve las peticiones que atiende el worker que recibió el 'start'.
+
+Uso:
+    POST /dashboard/profiler/start  seconds=10 [route=/reserve] [interval_ms=5]
+    POST /dashboard/profiler/start  requests=20 route=main.dashboard
+    GET  /dashboard/profiler                -> estado y resumen (JSON)
+    GET  /dashboard/profiler/collapsed      -> pilas colapsadas (texto)
+    POST /dashboard/profiler/stop
+"""
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+
+from flask import Blueprint, Response, current_app, jsonify, request
+from sqlalchemy.engine.default import DefaultDialect
+
+from extensions import db
+from users import login_required, admin_required
+
+profiler_bp = Blueprint('profiler', __name__)
+
+INTERVAL_MS = 5
+MAX_SECONDS = 60
+MAX_DEPTH = 128
+TOP = 15
+SQL_PREVIEW = 300
+
+_SITE_MARKERS = (os.sep + 'site-packages' + os.sep, os.sep + 'dist-packages' + os.sep)
+_STDLIB = sysconfig.get_paths()['stdlib'] + os.sep
+
+
+# ==========================================
+# 1. SESIÓN DE MUESTREO
+# ==========================================
+class ProfileSession:
+    """
+    Una sesión de muestreo. Los hooks de petición registran qué hilos atienden
+    peticiones que coinciden con 'route'; el hilo de muestreo solo mira esos.
+    """
+    def __init__(self, seconds, route=None, requests=None, interval_ms=INTERVAL_MS,
+                 root_path='', template_root='', sql_codes=()):
+        self.seconds = seconds
+        self.route = route
+        self.max_requests = requests
+        self.interval = interval_ms / 1000.0
+        self.root_path = root_path
+        self.template_root = template_root
+        self.sql_codes = frozenset(sql_codes)
+
+        self.targets = {}          # ident del hilo -> (etiqueta, inicio)
+        self.stacks = Counter()    # (etiqueta, code_1, ..., code_n) -> muestras
+        self.sql = Counter()       # sentencia -> muestras
+        self.samples = 0
+        self.finished_requests = []
+        self.started_at = None
+        self.stopped_at = None
+        self.stop_reason = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self.stopped_at is None
+
+    def matches(self, req):
+        return self.route is None or req.path == self.route or req.endpoint == self.route
+
+    # --- Hooks de petición ---
+    def enter(self, req):
+        if self.max_requests is not None and \
+                len(self.finished_requests) + len(self.targets) >= self.max_requests:
+            return
+        self.targets[threading.get_ident()] = (f"{req.method} {req.path}", time.perf_counter())
+
+    def leave(self):
+        target = self.targets.pop(threading.get_ident(), None)
+        if target is None:
+            return
+        label, started = target
+        with self._lock:
+            self.finished_requests.append((label, round((time.perf_counter() - started) * 1000, 2)))
+        if self.max_requests is not None and len(self.finished_requests) >= self.max_requests:
+            self.stop('requests')
+
+    # --- Hilo de muestreo ---
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self, reason='manual'):
+        if self.stop_reason is None:
+            self.stop_reason = reason
+        self._stop.set()
+
+    def _run(self):
+        deadline = time.monotonic() + self.seconds
+        own = threading.get_ident()
+        try:
+            while not self._stop.wait(self.interval):
+                if time.monotonic() >= deadline:
+                    self.stop('timeout')
+                    break
+                if self.targets:
+                    self._sample(own)
+        finally:
+            self.stopped_at = time.time()
+            _finished(self)
+
+    def _sample(self, own):
+        frames = sys._current_frames()
+        sql_codes = self.sql_codes
+        with self._lock:
+            for ident, (label, _) in list(self.targets.items()):
+                frame = frames.get(ident)
+                if frame is None or ident == own:
+                    continue
+                codes = []
+                while frame is not None and len(codes) < MAX_DEPTH:
+                    code = frame.f_code
+                    if code in sql_codes:
+                        statement = frame.f_locals.get('statement')
+                        if statement:
+                            self.sql[' '.join(str(statement).split())[:SQL_PREVIEW]] += 1
+                    codes.append(code)
+                    frame = frame.f_back
+                codes.reverse()
+                self.stacks[(label, *codes)] += 1
+                self.samples += 1
+
+    # ==========================================
+    # 2. RESULTADOS
+    # ==========================================
+    def frame_name(self, code):
+        """'función (archivo:línea)' con rutas relativas a la app o a site-packages."""
+        filename = code.co_filename
+        for marker in _SITE_MARKERS:
+            if marker in filename:
+                filename = filename.split(marker, 1)[1]
+                break
+        else:
+            if self.is_template(code):
+                return f"{os.path.relpath(filename, self.template_root)}:{code.co_name}"
+            if self.root_path and filename.startswith(self.root_path):
+                filename = os.path.relpath(filename, self.root_path)
+            elif filename.startswith(_STDLIB):
+                filename = filename[len(_STDLIB):]
+        return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+    def is_template(self, code):
+        return bool(self.template_root) and code.co_filename.startswith(self.template_root)
+
+    def is_app_code(self, code):
+        filename = code.co_filename
+        return (filename.startswith(self.root_path) and not self.is_template(code)
+                and not any(m in filename for m in _SITE_MARKERS))
+
+    def collapsed(self):
+        """Pilas colapsadas: 'ruta;frame;...;frame muestras' por línea."""
+        with self._lock:
+            stacks = list(self.stacks.items())
+        lines = []
+        for (label, *codes), count in stacks:
+            names = [label] + [self.frame_name(c).replace(';', ',') for c in codes]
+            lines.append(f"{';'.join(names)} {count}")
+        lines.sort()
+        return '\n'.join(lines) + ('\n' if lines else '')
+
+    def report(self, top=TOP):
+        with self._lock:
+            stacks = list(self.stacks.items())
+            sql = self.sql.most_common(top)
+            requests_done = list(self.finished_requests)
+        total = self.samples
+        self_time, inclusive, templates, sql_callers = Counter(), Counter(), Counter(), Counter()
+        sql_codes = self.sql_codes
+        for (label, *codes), count in stacks:
+            if codes:
+                self_time[codes[-1]] += count
+            for code in set(codes):
+                inclusive[code] += count
+                if self.is_template(code):
+                    templates[code] += count
+            # Quién en la app (vista o plantilla) estaba esperando la consulta
+            if any(c in sql_codes for c in codes):
+                caller = next((c for c in reversed(codes)
+                               if self.is_app_code(c) or self.is_template(c)), None)
+                if caller is not None:
+                    sql_callers[caller] += count
+
+        def rows(counter):
+            return [{'frame': self.frame_name(code), 'samples': n, 'ms': round(n * self.interval * 1000, 1),
+                     'pct': round(100.0 * n / total, 1) if total else 0.0}
+                    for code, n in counter.most_common(top)]
+
+        sql_samples = sum(n for (label, *codes), n in stacks if any(c in sql_codes for c in codes))
+        durations = sorted(ms for _, ms in requests_done)
+        return {
+            'running': self.running,
+            'route': self.route,
+            'started_at': self.started_at,
+            'stopped_at': self.stopped_at,
+            'stop_reason': self.stop_reason,
+            'interval_ms': round(self.interval * 1000, 3),
+            'samples': total,
+            'sql_pct': round(100.0 * sql_samples / total, 1) if total else 0.0,
+            'requests': {
+                'count': len(durations),
+                'p50_ms': durations[len(durations) // 2] if durations else None,
+                'max_ms': durations[-1] if durations else None,
+            },
+            'top_self': rows(self_time),
+            'top_app': rows(Counter({c: n for c, n in inclusive.items() if self.is_app_code(c)})),
+            'top_sql': [{'statement': s, 'samples': n, 'ms': round(n * self.interval * 1000, 1)}
+                        for s, n in sql],
+            'top_sql_callers': rows(sql_callers),
+            'top_templates': rows(templates),
+        }
+
+
+# Sesión activa (una por proceso) y la última terminada, para consultarla
+_state = {'active': None, 'last': None}
+_state_lock = threading.Lock()
+
+def _finished(profile):
+    with _state_lock:
+        if _state['active'] is profile:
+            _state['active'] = None
+        _state['last'] = profile
+
+def current_session():
+    return _state['active'] or _state['last']
+
+
+def start_session(seconds=None, route=None, requests=None, interval_ms=INTERVAL_MS):
+    """
+    Inicia una sesión en este worker. Devuelve None si ya hay una en curso.
+    'seconds' se recorta a PROFILER_MAX_SECONDS.
+    """
+    cap = current_app.config.get('PROFILER_MAX_SECONDS', MAX_SECONDS)
+    seconds = min(seconds or cap, cap)
+    dialect = type(db.engine.dialect)
+    sql_codes = {f.__code__ for f in (DefaultDialect.do_execute, DefaultDialect.do_executemany,
+                                      dialect.do_execute, dialect.do_executemany)}
+    profile = ProfileSession(
+        seconds, route=route, requests=requests, interval_ms=interval_ms,
+        root_path=current_app.root_path,
+        template_root=os.path.join(current_app.root_path, current_app.template_folder or 'templates'),
+        sql_codes=sql_codes)
+    with _state_lock:
+        if _state['active'] is not None:
+            return None
+        _state['active'] = profile
+    profile.start()
+    return profile
+
+
+# ==========================================
+# 3. HOOKS (sin sesión activa: una lectura de diccionario)
+# ==========================================
+@profiler_bp.before_app_request
+def _enter_request():
+    profile = _state['active']
+    if profile is not None and profile.matches(request):
+        profile.enter(request)
+
+@profiler_bp.teardown_app_request
+def _leave_request(exc):
+    profile = _state['active']
+    if profile is not None:
+        profile.leave()
+
+
+# ==========================================
+# 4. ENDPOINTS DE ADMINISTRACIÓN
+# ==========================================
+@profiler_bp.route('/dashboard/profiler/start', methods=['POST'])
+@login_required
+@admin_required
+def start():
+    data = request.get_json(silent=True) or request.form
+    try:
+        seconds = float(data['seconds']) if data.get('seconds') else None
+        requests_n = int(data['requests']) if data.get('requests') else None
+        interval_ms = float(data.get('interval_ms') or INTERVAL_MS)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Parámetros inválidos.'}), 400
+    route = data.get('route') or None
+    if requests_n is not None and (requests_n < 1 or route is None):
+        return jsonify({'success': False, 'message': "El modo por peticiones requiere 'route'."}), 400
+    if (seconds is not None and seconds <= 0) or not 1 <= interval_ms <= 1000:
+        return jsonify({'success': False, 'message': 'Parámetros fuera de rango.'}), 400
+
+    profile = start_session(seconds, route=route, requests=requests_n, interval_ms=interval_ms)
+    if profile is None:
+        return jsonify({'success': False, 'message': 'Ya hay una sesión de perfilado en curso.'}), 409
+    return jsonify({'success': True, 'seconds': profile.seconds, 'route': route,
+                    'requests': requests_n, 'interval_ms': interval_ms, 'pid': os.getpid()})
+
+@profiler_bp.route('/dashboard/profiler/stop', methods=['POST'])
+@login_required
+@admin_required
+def stop():
+    profile = _state['active']
+    if profile is None:
+        return jsonify({'success': False, 'message': 'No hay una sesión en curso.'}), 404
+    profile.stop()
+    return jsonify({'success': True})
+
+@profiler_bp.route('/dashboard/profiler')
+@login_required
+@admin_required
+def status():
+    profile = current_session()
+    if profile is None:
+        return jsonify({'success': True, 'session': None})
+    return jsonify({'success': True, 'pid': os.getpid(),
+                    'session': profile.report(request.args.get('top', TOP, type=int))})
+
+@profiler_bp.route('/dashboard/profiler/collapsed')
+@login_required
+@admin_required
+def collapsed():
+    profile = current_session()
+    if profile is None:
+        return jsonify({'success': False, 'message': 'No hay sesiones de perfilado.'}), 404
+    return Response(profile.collapsed(), mimetype='text/plain')
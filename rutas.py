@@ -4,11 +4,21 @@ import random
 import string
 from datetime import datetime
 from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, current_app, session, jsonify
+from sqlalchemy import or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from extensions import db
 # Importamos todos los modelos necesarios, incluyendo el nuevo Client
 from models import Collaborator, Bus, Reservation, AboutUs, Client
 # Importamos la seguridad desde users.py
 from users import User, login_required
+from profile import render_profile
+from tasks import enqueue_reservation_side_effects
+from schedules import STUDENT_SERVICE, Recurrence, schedule_from_form
+from pricing import apply_quote
+from audit import record
+from sessions import revoke_user_sessions
+from cache import TTLCache, TokenBucketLimiter, MISSING, rate_limited
 from werkzeug.utils import secure_filename
 
 main_bp = Blueprint('main', __name__)
@@ -16,6 +26,33 @@ main_bp = Blueprint('main', __name__)
 UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+# Cachés de las APIs que el formulario consulta mientras el usuario escribe.
+# PIN -> datos del cliente, y (teléfono, email) -> PIN. None = no existe.
+client_cache = TTLCache(maxsize=10000, ttl=300, negative_ttl=30)
+recover_cache = TTLCache(maxsize=10000, ttl=300, negative_ttl=30)
+# 5 peticiones/segundo por IP con ráfagas de hasta 20
+api_limiter = TokenBucketLimiter(rate=5, burst=20)
+
+def invalidate_client_cache(pin, *contacts):
+    """
+    Olvida lo cacheado de un cliente tras crearlo o modificarlo.
+    'contacts' son los pares (teléfono, email) anteriores y nuevos.
+    """
+    client_cache.pop(pin)
+    for contact in contacts:
+        recover_cache.pop(contact)
+
+def client_payload(client):
+    """Datos públicos del cliente para autocompletar el formulario."""
+    return {
+        'success': True,
+        'name': client.name,
+        'last_name1': client.last_name1,
+        'last_name2': client.last_name2,
+        'phone': client.phone,
+        'email': client.email
+    }
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -24,12 +61,32 @@ def generate_pin():
     """
     Genera un PIN ALFANUMÉRICO de 8 caracteres (Letras Mayúsculas y Números).
     Ejemplo: A1B2C3D4
+    No consulta la base: la unicidad la garantiza el índice único de Client.pin
+    y el INSERT ... ON CONFLICT de insert_client (36^8 combinaciones).
     """
     characters = string.ascii_uppercase + string.digits
-    while True:
-        pin = ''.join(random.choices(characters, k=8))
-        if not Client.query.filter_by(pin=pin).first():
-            return pin
+    return ''.join(random.choices(characters, k=8))
+
+def insert_client(name, lname1, lname2, phone, email, attempts=3):
+    """
+    Alta de cliente con INSERT ... ON CONFLICT DO NOTHING dentro de la
+    transacción en curso (sin commit). Devuelve (id, pin) o (None, None) si el
+    teléfono o el email ya existen, incluso si otra solicitud concurrente los
+    registró después de nuestra búsqueda.
+    """
+    for _ in range(attempts):
+        pin = generate_pin()
+        result = db.session.execute(
+            sqlite_insert(Client).values(
+                pin=pin, name=name, last_name1=lname1, last_name2=lname2, phone=phone, email=email
+            ).on_conflict_do_nothing()
+        )
+        if result.rowcount:
+            return result.inserted_primary_key[0], pin
+        # Conflicto: si no fue por teléfono/email, fue una colisión de PIN y se reintenta
+        if Client.query.filter(or_(Client.phone == phone, Client.email == email)).first():
+            return None, None
+    return None, None
 
 @main_bp.route('/')
 def home():
@@ -38,24 +95,21 @@ def home():
     return render_template('home.html', about=about)
 
 @main_bp.route('/api/get_client/<pin>', methods=['GET'])
+@rate_limited(api_limiter)
 def get_client_info(pin):
     """
     API JSON: Busca un cliente por su PIN para autocompletar.
     """
     pin = pin.upper()
-    client = Client.query.filter_by(pin=pin).first()
-    if client:
-        return jsonify({
-            'success': True,
-            'name': client.name,
-            'last_name1': client.last_name1,
-            'last_name2': client.last_name2,
-            'phone': client.phone,
-            'email': client.email
-        })
-    return jsonify({'success': False})
+    payload = client_cache.get(pin)
+    if payload is MISSING:
+        client = Client.query.filter_by(pin=pin).first()
+        payload = client_payload(client) if client else None
+        client_cache.set(pin, payload)
+    return jsonify(payload or {'success': False})
 
 @main_bp.route('/api/recover_pin', methods=['POST'])
+@rate_limited(api_limiter)
 def recover_pin():
     """
     API para recuperar el PIN validando teléfono y email.
@@ -67,11 +121,15 @@ def recover_pin():
     if not phone or not email:
         return jsonify({'success': False, 'message': 'Por favor ingrese ambos datos.'})
     
-    # Buscar cliente que coincida exactamente con ambos datos
-    client = Client.query.filter_by(phone=phone, email=email).first()
+    # Buscar cliente que coincida exactamente con ambos datos (usa los índices de teléfono/email)
+    payload = recover_cache.get((phone, email))
+    if payload is MISSING:
+        client = Client.query.filter_by(phone=phone, email=email).first()
+        payload = {'success': True, 'pin': client.pin, 'name': client.name} if client else None
+        recover_cache.set((phone, email), payload)
     
-    if client:
-        return jsonify({'success': True, 'pin': client.pin, 'name': client.name})
+    if payload:
+        return jsonify(payload)
     else:
         return jsonify({'success': False, 'message': 'No encontramos un registro que coincida con ese Teléfono y Email.'})
 
@@ -99,44 +157,41 @@ def create_reservation():
     phone = request.form.get('client_phone')
     email = request.form.get('client_email')
 
+    # Una sola consulta indexada resuelve el PIN y los posibles duplicados
+    filters = [Client.phone == phone, Client.email == email]
+    if pin_ingresado:
+        filters.append(Client.pin == pin_ingresado)
+    matches = Client.query.filter(or_(*filters)).all()
+
     # A. Intentar buscar si existe por PIN
     if pin_ingresado:
-        client = Client.query.filter_by(pin=pin_ingresado).first()
-    
+        client = next((c for c in matches if c.pin == pin_ingresado), None)
+    others = [c for c in matches if c is not client]
+
+    # Teléfono y email no pueden pertenecer a otro cliente (ni al actualizar ni al registrar)
+    if any(c.phone == phone for c in others):
+        flash(f"El número de teléfono {phone} ya está registrado. Por favor use la opción '¿Olvidó su PIN?'", "danger")
+        return redirect(url_for('main.home'))
+    if any(c.email == email for c in others):
+        flash(f"El correo electrónico {email} ya está registrado. Por favor use la opción '¿Olvidó su PIN?'", "danger")
+        return redirect(url_for('main.home'))
+
     if client:
         # Si existe, actualizamos sus datos (por si cambiaron teléfono/email)
+        old_contact = (client.phone, client.email)
         client.name = name
         client.last_name1 = lname1
         client.last_name2 = lname2
         client.phone = phone
         client.email = email
+        client_id = client.id
     else:
-        # B. Intento de registro NUEVO -> VALIDAR DUPLICADOS
-        
-        # 1. Validar Teléfono existente
-        existing_phone = Client.query.filter_by(phone=phone).first()
-        if existing_phone:
-            flash(f"El número de teléfono {phone} ya está registrado. Por favor use la opción '¿Olvidó su PIN?'", "danger")
+        # B. Registro NUEVO: se inserta en la misma transacción que la reserva
+        client_id, new_pin_generated = insert_client(name, lname1, lname2, phone, email)
+        if client_id is None:
+            db.session.rollback()
+            flash(f"El número de teléfono {phone} o el correo {email} ya está registrado. Por favor use la opción '¿Olvidó su PIN?'", "danger")
             return redirect(url_for('main.home'))
-            
-        # 2. Validar Email existente
-        existing_email = Client.query.filter_by(email=email).first()
-        if existing_email:
-            flash(f"El correo electrónico {email} ya está registrado. Por favor use la opción '¿Olvidó su PIN?'", "danger")
-            return redirect(url_for('main.home'))
-
-        # Si no existen duplicados, creamos un nuevo cliente
-        new_pin_generated = generate_pin()
-        client = Client(
-            pin=new_pin_generated,
-            name=name,
-            last_name1=lname1,
-            last_name2=lname2,
-            phone=phone,
-            email=email
-        )
-        db.session.add(client)
-        db.session.commit() # Commit necesario para obtener el ID y asegurar el PIN
         is_new_client = True
 
     # ---------------------------------------------------------
@@ -161,11 +216,19 @@ def create_reservation():
         if day and month and year:
             date_str = f"{day}-{month}-{year}"
 
+    # Contrato de estudiantes con curso lectivo: se guarda la regla de
+    # recurrencia (una sola vez) en lugar de una solicitud por viaje
+    schedule = schedule_from_form(request.form) if service_type == 'Transporte de Estudiantes' else None
+    if schedule and date_str == "Pendiente":
+        first_trip = Recurrence.from_schedule(schedule).first()
+        if first_trip:
+            date_str = f"{first_trip.day}-{first_trip.month}-{first_trip.year}"
+
     # ---------------------------------------------------------
     # 3. CREACIÓN DE LA RESERVA
     # ---------------------------------------------------------
     new_res = Reservation(
-        client=client,  # Relación con el objeto Cliente
+        client_id=client_id,  # Cliente existente o recién insertado
         
         # Datos Generales
         date=date_str,
@@ -190,8 +253,24 @@ def create_reservation():
         trip_duration=int(request.form.get('int_days', 0) or 0)
     )
     
+    if schedule:
+        schedule.reservation = new_res
+    apply_quote(new_res)
+
+    # Cliente, reserva y horario se confirman juntos en un único commit
     db.session.add(new_res)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Otra solicitud registró el mismo teléfono o email entre la búsqueda y el commit
+        db.session.rollback()
+        flash(f"El número de teléfono {phone} o el correo {email} ya está registrado. Por favor use la opción '¿Olvidó su PIN?'", "danger")
+        return redirect(url_for('main.home'))
+    invalidate_client_cache(new_pin_generated or pin_ingresado, (phone, email),
+                            *([old_contact] if client else []))
+
+    # Efectos secundarios (avisos, reporte, resúmenes) en segundo plano
+    enqueue_reservation_side_effects(new_res.id)
     
     # Manejo de Mensajes y Modals
     if is_new_client and new_pin_generated:
@@ -217,6 +296,7 @@ def cancel_reservation(id):
         
         res.status = 'Cancelada'
         res.cancelled_at = now
+        record('reservation', res.id, 'cancel', {'from': 'Pendiente', 'to': 'Cancelada'})
         
         db.session.commit()
         flash("Tu solicitud ha sido cancelada y registrada en tu historial.", "warning")
@@ -242,6 +322,7 @@ def review_reservation(id):
 
     if res.status == 'Pendiente':
         res.status = 'Revisado'
+        record('reservation', res.id, 'review', {'from': 'Pendiente', 'to': 'Revisado'})
         db.session.commit()
         flash(f"Solicitud #{id} marcada como REVISADA.", "success")
     
@@ -249,8 +330,7 @@ def review_reservation(id):
     if return_pin:
         client = Client.query.filter_by(pin=return_pin).first()
         if client:
-            reservations = Reservation.query.filter_by(client_id=client.id).order_by(Reservation.id.desc()).all()
-            return render_template('perfil.html', client=client, reservations=reservations, pin=return_pin)
+            return render_profile(client, return_pin)
     
     return redirect(url_for('main.dashboard'))
 
@@ -266,12 +346,13 @@ def edit_reservation(id):
     if res.status != 'Pendiente':
         flash("Solo se pueden editar solicitudes que estén pendientes.", "warning")
         if res.client:
-            return render_template('perfil.html', client=res.client, reservations=Reservation.query.filter_by(client_id=res.client.id).order_by(Reservation.id.desc()).all(), pin=res.client.pin)
+            return render_profile(res.client, res.client.pin)
         return redirect(url_for('main.home'))
 
     if request.method == 'POST':
         # 1. Actualizar Datos del Cliente
         if res.client:
+            old_contact = (res.client.phone, res.client.email)
             res.client.name = request.form.get('client_name')
             res.client.last_name1 = request.form.get('client_lastname1')
             res.client.last_name2 = request.form.get('client_lastname2')
@@ -292,7 +373,7 @@ def edit_reservation(id):
             # Limpiar campos de otros servicios
             res.institution_name = None
             res.schedule_type = None
-        elif service_type == 'Transporte de Estudiantes':
+        elif service_type == STUDENT_SERVICE:
             # Construir fecha si se enviaron partes
             day = request.form.get('day')
             month = request.form.get('month')
@@ -318,6 +399,11 @@ def edit_reservation(id):
             res.institution_name = None
             res.country = None
 
+        # Si deja de ser transporte de estudiantes, el contrato recurrente se borra
+        # (delete-orphan) para que no siga generando viajes en el calendario
+        if service_type != STUDENT_SERVICE and res.schedule is not None:
+            res.schedule = None
+
         # Datos comunes
         res.origin = request.form.get('origin')
         res.origin_url = request.form.get('origin_url')
@@ -327,12 +413,21 @@ def edit_reservation(id):
         res.comments = request.form.get('comments')
         res.needs_pickup = request.form.get('pickup') == 'si'
         res.pickup_locations = request.form.get('pickup_list')
-
-        db.session.commit()
+        apply_quote(res)
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Teléfono o email en uso por otro cliente (índices únicos de Client)
+            db.session.rollback()
+            flash("El teléfono o el correo electrónico ya pertenece a otro cliente.", "danger")
+            return render_template('perfil_edit.html', res=res, client=res.client)
+        if res.client:
+            invalidate_client_cache(res.client.pin, old_contact, (res.client.phone, res.client.email))
         flash("Solicitud actualizada correctamente.", "success")
         
         # Redirigir al perfil simulando el PIN
-        return render_template('perfil.html', client=res.client, reservations=Reservation.query.filter_by(client_id=res.client.id).order_by(Reservation.id.desc()).all(), pin=res.client.pin)
+        return render_profile(res.client, res.client.pin)
 
     return render_template('perfil_edit.html', res=res, client=res.client)
 
@@ -352,13 +447,24 @@ def dashboard():
     colaboradores = Collaborator.query.all()
     reservas = Reservation.query.all()
     about = AboutUs.query.first()
-    return render_template('dashboard.html', stats=stats, colabs=colaboradores, reservas=reservas, about=about)
+    colab_names = {c.id: f"{c.name} {c.last_name1}" for c in colaboradores}
+    return render_template('dashboard.html', stats=stats, colabs=colaboradores, colab_names=colab_names,
+                           reservas=reservas, about=about)
 
 @main_bp.route('/dashboard/export')
 @login_required
 def export_data():
     """Genera un archivo de texto con el reporte de reservas."""
-    res = Reservation.query.all()
+    write_export_report()
+    flash("Datos exportados a reporte_reservas.txt", "info")
+    return redirect(url_for('main.dashboard'))
+
+def write_export_report(path="reporte_reservas.txt"):
+    """
+    Construye y guarda el reporte de reservas.
+    También lo usa la tarea en segundo plano 'regenerate_export' (tasks.py).
+    """
+    res = Reservation.query.options(db.selectinload(Reservation.schedule)).all()
     content = "REPORTE DE RESERVAS\n" + "="*20 + "\n"
     
     for r in res:
@@ -366,6 +472,9 @@ def export_data():
         extra_info = ""
         if r.service_category == 'Viajes Internacionales':
              extra_info = f" | País: {r.country} | Regreso: {r.return_date} ({r.trip_duration} días)"
+        elif r.schedule:
+             # La regla describe todos los viajes del contrato sin enumerarlos
+             extra_info = f" | Institución: {r.institution_name} | Horario: {Recurrence.from_schedule(r.schedule).describe()}"
         
         status_str = r.status
         if r.status == 'Cancelada' and r.cancelled_at:
@@ -373,17 +482,15 @@ def export_data():
             
         content += f"ID: {r.id} | Cliente: {cliente_nombre} | Destino: {r.destination} | Salida: {r.date} | Estado: {status_str}{extra_info}\n"
     
-    with open("reporte_reservas.txt", "w") as f:
+    with open(path, "w") as f:
         f.write(content)
-        
-    flash("Datos exportados a reporte_reservas.txt", "info")
-    return redirect(url_for('main.dashboard'))
 
 @main_bp.route('/dashboard/update_status/<int:id>/<string:new_status>', methods=['POST'])
 @login_required
 def update_status(id, new_status):
     """Cambia el estado de una reserva (ej: Pendiente -> Aprobada)."""
     res = Reservation.query.get_or_404(id)
+    record('reservation', res.id, 'status', {'from': res.status, 'to': new_status})
     res.status = new_status
     db.session.commit()
     flash(f"Reserva #{id} actualizada a {new_status}", "success")
@@ -495,6 +602,20 @@ def create_about():
     about = AboutUs.query.first()
     return render_template('aboutus_create.html', about=about)
 
+# Categorías de /delete -> tipo de entidad en la bitácora (audit.py)
+AUDIT_ENTITIES = {'user': 'user', 'colab': 'colab', 'res': 'reservation', 'about': 'about'}
+
+def deleted_summary(category, item):
+    """Datos que identifican al elemento borrado en la bitácora."""
+    if category == 'user':
+        return {'username': item.username, 'email': item.email, 'role': item.role}
+    if category == 'colab':
+        return {'name': f"{item.name} {item.last_name1}"}
+    if category == 'res':
+        return {'client_id': item.client_id, 'status': item.status, 'date': item.date,
+                'service_category': item.service_category}
+    return None
+
 @main_bp.route('/delete/<string:category>/<int:id>', methods=['POST'])
 @login_required
 def erase_item(category, id):
@@ -512,8 +633,15 @@ def erase_item(category, id):
         item = AboutUs.query.get_or_404(id)
     
     if item:
+        record(AUDIT_ENTITIES[category], id, 'delete', deleted_summary(category, item))
+        if category == 'colab':
+            # Sus viajes (y unidades, que se borran en cascada) quedan sin asignar
+            Reservation.query.filter_by(collaborator_id=id).update(
+                {'collaborator_id': None, 'bus_id': None}, synchronize_session=False)
         db.session.delete(item)
         db.session.commit()
+        if category == 'user':
+            revoke_user_sessions(id)
         flash(f"Elemento eliminado correctamente", "warning")
     
     return redirect(url_for('main.dashboard'))
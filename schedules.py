@@ -0,0 +1,292 @@
+# Archivo: schedules.py
+"""
+Horarios recurrentes de Transporte de Estudiantes.
+
+Un contrato guarda una sola regla (StudentSchedule): días de la semana,
+inicio y fin del curso lectivo y feriados excluidos. Los viajes concretos no
+se guardan como filas: Recurrence.between() los genera bajo demanda para
+cualquier rango de fechas, saltando directamente de un día activo al
+siguiente. Calendario, control de cupo y reporte consumen ese generador.
+
+Para las próximas INDEX_WEEKS semanas se mantiene además un índice en memoria
+(día -> viajes) que se reconstruye cuando se confirma un cambio en algún
+contrato o cuando vence (otros workers pueden haber escrito).
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from collections import namedtuple
+from datetime import date, timedelta
+from itertools import islice
+
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Bus, Reservation, StudentSchedule, parse_trip_date
+from users import login_required
+
+schedules_bp = Blueprint('schedules', __name__)
+
+STUDENT_SERVICE = 'Transporte de Estudiantes'
+WEEKDAYS = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
+# Opciones de "FECHAS REQUERIDAS" del formulario
+SCHEDULE_TYPE_MASKS = {
+    'Lunes a Viernes': 0b0011111,
+    'Sábados': 0b0100000,
+}
+INDEX_WEEKS = 8
+INDEX_MAX_AGE = 300  # segundos
+MAX_WINDOW_DAYS = 366
+
+Occurrence = namedtuple('Occurrence', 'day schedule_id reservation_id institution departure_time seats')
+
+
+# ==========================================
+# 1. REGLAS DE RECURRENCIA
+# ==========================================
+def _normalize(text):
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+def weekday_mask(schedule_type, detail=None):
+    """
+    Máscara de días a partir del formulario. Para 'Personalizado' se buscan
+    los nombres de los días en el detalle (ej: 'Martes y Jueves').
+    """
+    if schedule_type in SCHEDULE_TYPE_MASKS:
+        return SCHEDULE_TYPE_MASKS[schedule_type]
+    words = _normalize(detail or '').replace(',', ' ').split()
+    mask = 0
+    for i, name in enumerate(WEEKDAYS):
+        if name in words:
+            mask |= 1 << i
+    return mask
+
+def parse_holidays(text):
+    """Fechas separadas por coma o espacio (AAAA-MM-DD o D-M-AAAA) -> conjunto de date."""
+    days = (parse_trip_date(part) for part in (text or '').replace(',', ' ').split())
+    return frozenset(d for d in days if d)
+
+def format_holidays(days):
+    return ','.join(sorted(d.isoformat() for d in days))
+
+
+class Recurrence:
+    """
+    Regla compilada: para cada día de la semana se precalcula cuántos días
+    faltan hasta el próximo día activo, así el generador no revisa los días
+    sin viaje.
+    """
+    __slots__ = ('mask', 'term_start', 'term_end', 'holidays', '_skip', '_gap')
+
+    def __init__(self, mask, term_start, term_end, holidays=frozenset()):
+        self.mask = mask
+        self.term_start = term_start
+        self.term_end = term_end
+        self.holidays = holidays
+        active = [bool(mask & (1 << w)) for w in range(7)]
+        # _skip[w]: días hasta el próximo activo contando el mismo día (0 si w es activo)
+        # _gap[w]: días hasta el siguiente activo después de w
+        self._skip = [next((k for k in range(7) if active[(w + k) % 7]), None) for w in range(7)]
+        self._gap = [next((k for k in range(1, 8) if active[(w + k) % 7]), None) for w in range(7)]
+
+    @classmethod
+    def from_schedule(cls, schedule):
+        return cls(schedule.weekdays, parse_trip_date(schedule.term_start),
+                   parse_trip_date(schedule.term_end), parse_holidays(schedule.holidays))
+
+    def between(self, start, end):
+        """Genera (sin materializar) las fechas con viaje dentro de [start, end]."""
+        if not self.mask or not self.term_start or not self.term_end:
+            return
+        day = max(start, self.term_start)
+        last = min(end, self.term_end)
+        day += timedelta(days=self._skip[day.weekday()])
+        while day <= last:
+            if day not in self.holidays:
+                yield day
+            day += timedelta(days=self._gap[day.weekday()])
+
+    def first(self):
+        return next(self.between(self.term_start, self.term_end), None)
+
+    def describe(self):
+        days = ', '.join(WEEKDAYS[w].capitalize() for w in range(7) if self.mask & (1 << w))
+        return f"{days} del {self.term_start} al {self.term_end}"
+
+
+def schedule_from_form(form):
+    """
+    StudentSchedule a partir del formulario de estudiantes, o None si no se
+    indicó el curso lectivo (la reserva queda como viaje único).
+    Los feriados de app.config['SCHOOL_HOLIDAYS'] se agregan siempre.
+    """
+    term_start = parse_trip_date(form.get('term_start'))
+    term_end = parse_trip_date(form.get('term_end'))
+    mask = weekday_mask(form.get('schedule_type'), form.get('custom_date_detail'))
+    if not term_start or not term_end or term_end < term_start or not mask:
+        return None
+    holidays = parse_holidays(form.get('holidays')) | parse_holidays(
+        ' '.join(current_app.config.get('SCHOOL_HOLIDAYS', [])))
+    return StudentSchedule(weekdays=mask, term_start=term_start.isoformat(),
+                           term_end=term_end.isoformat(), holidays=format_holidays(holidays))
+
+
+# ==========================================
+# 2. EXPANSIÓN PEREZOSA
+# ==========================================
+def active_contracts(start, end):
+    """Contratos no cancelados cuyo curso se cruza con [start, end], ya compilados."""
+    rows = db.session.query(StudentSchedule, Reservation.institution_name,
+                            Reservation.departure_time, Reservation.capacity_needed)\
+        .join(Reservation, StudentSchedule.reservation_id == Reservation.id)\
+        .filter(Reservation.status != 'Cancelada',
+                Reservation.service_category == STUDENT_SERVICE,
+                StudentSchedule.term_end >= start.isoformat(),
+                StudentSchedule.term_start <= end.isoformat())
+    return [(Recurrence.from_schedule(s), s.id, s.reservation_id, institution, departure_time, seats or 0)
+            for s, institution, departure_time, seats in rows]
+
+def iter_occurrences(contracts, start, end):
+    """Viajes de todos los contratos en orden de fecha, sin armar listas intermedias."""
+    streams = [
+        (Occurrence(day, schedule_id, reservation_id, institution, departure_time, seats)
+         for day in rule.between(start, end))
+        for rule, schedule_id, reservation_id, institution, departure_time, seats in contracts
+    ]
+    return heapq.merge(*streams, key=lambda o: o.day)
+
+
+# ==========================================
+# 3. ÍNDICE DE LAS PRÓXIMAS SEMANAS
+# ==========================================
+class OccurrenceIndex:
+    """Viajes precalculados por día para las próximas 'weeks' semanas."""
+    def __init__(self, weeks=INDEX_WEEKS, max_age=INDEX_MAX_AGE):
+        self.weeks = weeks
+        self.max_age = max_age
+        self._days = {}
+        self._start = None
+        self._built_at = 0.0
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._stale = True
+
+    def _fresh(self, today):
+        return not self._stale and self._start == today and time.monotonic() - self._built_at < self.max_age
+
+    def _ensure(self):
+        today = date.today()
+        if self._fresh(today):
+            return
+        with self._lock:
+            if self._fresh(today):
+                return
+            # Se marca antes de leer: una invalidación durante la carga no se pierde
+            self._stale = False
+            end = today + timedelta(weeks=self.weeks) - timedelta(days=1)
+            days = {}
+            for occ in iter_occurrences(active_contracts(today, end), today, end):
+                days.setdefault(occ.day, []).append(occ)
+            self._days, self._start = days, today
+            self._built_at = time.monotonic()
+
+    @property
+    def end(self):
+        return self._start + timedelta(weeks=self.weeks) - timedelta(days=1)
+
+    def window(self, start, end):
+        """Viajes en [start, end]: del índice si cae dentro, si no se generan al vuelo."""
+        self._ensure()
+        if start >= self._start and end <= self.end:
+            days = self._days
+            span = (end - start).days + 1
+            return [occ for i in range(span) for occ in days.get(start + timedelta(days=i), ())]
+        return iter_occurrences(active_contracts(start, end), start, end)
+
+    def on(self, day):
+        return list(self.window(day, day))
+
+
+schedule_index = OccurrenceIndex()
+
+
+@event.listens_for(Session, 'after_flush')
+def _detect_schedule_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, StudentSchedule) or (
+                isinstance(obj, Reservation) and obj.service_category == STUDENT_SERVICE):
+            session.info['schedules_changed'] = True
+            return
+
+@event.listens_for(Session, 'after_commit')
+def _refresh_index(session):
+    if session.info.pop('schedules_changed', False):
+        schedule_index.invalidate()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('schedules_changed', None)
+
+
+# ==========================================
+# 4. CALENDARIO (DASHBOARD)
+# ==========================================
+def fleet_capacity():
+    return db.session.query(db.func.coalesce(db.func.sum(Bus.capacity), 0)).scalar()
+
+@schedules_bp.route('/dashboard/schedules/calendar')
+@login_required
+def calendar():
+    """
+    Viajes de estudiantes por día (JSON). ?start=AAAA-MM-DD&end=AAAA-MM-DD,
+    por defecto las próximas dos semanas. 'over_capacity' marca los días en
+    que los asientos contratados superan la capacidad de la flotilla.
+    """
+    start = parse_trip_date(request.args.get('start')) or date.today()
+    end = parse_trip_date(request.args.get('end')) or start + timedelta(days=13)
+    if end < start or (end - start).days >= MAX_WINDOW_DAYS:
+        return jsonify({'success': False, 'message': f'Rango inválido (máximo {MAX_WINDOW_DAYS} días).'}), 400
+
+    capacity = fleet_capacity()
+    days = []
+    for occ in schedule_index.window(start, end):
+        if not days or days[-1]['day'] != occ.day.isoformat():
+            days.append({'day': occ.day.isoformat(), 'seats': 0, 'trips': []})
+        entry = days[-1]
+        entry['seats'] += occ.seats
+        entry['trips'].append({'reservation_id': occ.reservation_id, 'institution': occ.institution,
+                               'departure_time': occ.departure_time, 'seats': occ.seats})
+    for entry in days:
+        entry['over_capacity'] = entry['seats'] > capacity
+    return jsonify({'success': True, 'fleet_capacity': capacity, 'days': days})
+
+@schedules_bp.route('/dashboard/schedules/<int:reservation_id>', methods=['POST'])
+@login_required
+def update_schedule(reservation_id):
+    """Modifica el curso lectivo, los días o los feriados de un contrato."""
+    schedule = StudentSchedule.query.filter_by(reservation_id=reservation_id).first_or_404()
+    data = request.get_json(silent=True) or request.form
+    term_start = parse_trip_date(data.get('term_start')) or parse_trip_date(schedule.term_start)
+    term_end = parse_trip_date(data.get('term_end')) or parse_trip_date(schedule.term_end)
+    try:
+        mask = int(data.get('weekdays', schedule.weekdays))
+    except (TypeError, ValueError):
+        mask = 0
+    if term_end < term_start or not 0 < mask < 128:
+        return jsonify({'success': False, 'message': 'Curso lectivo o días inválidos.'}), 400
+
+    schedule.term_start, schedule.term_end, schedule.weekdays = term_start.isoformat(), term_end.isoformat(), mask
+    if 'holidays' in data:
+        holidays = data['holidays']
+        schedule.holidays = format_holidays(parse_holidays(
+            ' '.join(holidays) if isinstance(holidays, list) else holidays))
+    db.session.commit()
+    rule = Recurrence.from_schedule(schedule)
+    return jsonify({'success': True, 'schedule': rule.describe(),
+                    'next': [d.isoformat() for d in islice(rule.between(date.today(), term_end), 10)]})
@@ -0,0 +1,218 @@
+# Archivo: seed.py
+"""
+Generador de datos sintéticos para pruebas de carga.
+
+Llena una base de datos con N clientes, reservas de todas las categorías de
+servicio, colaboradores y buses usando distribuciones parecidas a las reales.
+
+Uso:
+    python seed.py --clients 2000 --reservations 20000 --collaborators 40
+    python seed.py --db sqlite:///bench.db --clients 500 --seed 7
+"""
+import argparse
+import random
+import string
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+from app import create_app
+from extensions import db
+from models import Client, Collaborator, Bus, Reservation
+
+# Base de datos por defecto: separada de la productiva (instance/bench.db)
+DEFAULT_DB_URI = 'sqlite:///bench.db'
+
+NAMES = ['María', 'José', 'Ana', 'Luis', 'Carlos', 'Sofía', 'Daniela', 'Andrés',
+         'Valeria', 'Jorge', 'Fabiola', 'Esteban', 'Gabriela', 'Mauricio', 'Paola']
+LAST_NAMES = ['Rodríguez', 'Vargas', 'Jiménez', 'Mora', 'Rojas', 'Solano', 'Castro',
+              'Chaves', 'Araya', 'Quesada', 'Alvarado', 'Calderón', 'Méndez', 'Segura']
+PLACES = ['San José Centro', 'Heredia', 'Alajuela', 'Cartago', 'Liberia', 'Puntarenas',
+          'Limón', 'San Carlos', 'Pérez Zeledón', 'Escazú', 'Santa Ana', 'Tibás']
+INSTITUTIONS = ['Liceo de Costa Rica', 'Colegio Saint Francis', 'Escuela Juan Rafael Mora',
+                'CTP de Heredia', 'Colegio Humboldt', 'Escuela República de Chile']
+COUNTRIES = ['Panamá', 'Nicaragua', 'Honduras', 'Guatemala', 'El Salvador']
+BRANDS = ['Mercedes-Benz', 'Hyundai', 'Toyota', 'Yutong', 'Isuzu', 'King Long']
+
+# Distribuciones aproximadas observadas en la operación
+SERVICE_WEIGHTS = [
+    ('Transporte de Estudiantes', 0.55),
+    ('Servicios Especiales', 0.35),
+    ('Viajes Internacionales', 0.10),
+]
+STATUS_WEIGHTS = [('Pendiente', 0.35), ('Revisado', 0.20), ('Aprobada', 0.30), ('Cancelada', 0.15)]
+SCHEDULE_WEIGHTS = [('Lunes a Viernes', 0.75), ('Sábados', 0.15), ('Personalizado', 0.10)]
+# Los fines de semana concentran los servicios especiales (Lunes=0 ... Domingo=6)
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.0, 1.0, 1.3, 1.8, 1.4]
+
+
+def _weighted(rng, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights=weights, k=1)[0]
+
+
+def _departure_time(rng, service):
+    """Horas pico de la mañana y tarde para estudiantes, horario diurno para el resto."""
+    if service == 'Transporte de Estudiantes':
+        hour = rng.choice([5, 6, 6, 6, 7, 7, 12, 16, 17])
+    else:
+        hour = max(0, min(23, int(rng.gauss(9, 3))))
+    return f"{hour:02d}:{rng.choice([0, 15, 30, 45]):02d}"
+
+
+def _trip_date(rng, today, days_back, days_ahead):
+    """Fecha en el rango dado, ponderada por día de la semana."""
+    while True:
+        d = today + timedelta(days=rng.randint(-days_back, days_ahead))
+        if rng.random() * max(WEEKDAY_WEIGHTS) <= WEEKDAY_WEIGHTS[d.weekday()]:
+            return d
+
+
+def _pins(rng, count):
+    characters = string.ascii_uppercase + string.digits
+    pins = set()
+    while len(pins) < count:
+        pins.add(''.join(rng.choices(characters, k=8)))
+    return list(pins)
+
+
+def build_clients(rng, count, offset=0):
+    """Genera las filas de clientes (teléfono y email únicos)."""
+    rows = []
+    for i, pin in enumerate(_pins(rng, count)):
+        n = offset + i
+        name = rng.choice(NAMES)
+        rows.append({
+            'pin': pin,
+            'name': name,
+            'last_name1': rng.choice(LAST_NAMES),
+            'last_name2': rng.choice(LAST_NAMES),
+            'phone': f"{60000000 + n:08d}",
+            'email': f"{name.lower()}.{n}@correo.cr".encode('ascii', 'ignore').decode(),
+        })
+    return rows
+
+
+def build_reservation(rng, client_id, today, days_back=365, days_ahead=90):
+    """Genera una fila de reserva según la categoría de servicio sorteada."""
+    service = _weighted(rng, SERVICE_WEIGHTS)
+    trip = _trip_date(rng, today, days_back, days_ahead)
+    status = _weighted(rng, STATUS_WEIGHTS)
+    needs_pickup = rng.random() < 0.4
+    row = {
+        'client_id': client_id,
+        'origin': rng.choice(PLACES),
+        'origin_url': None,
+        'departure_time': _departure_time(rng, service),
+        'needs_pickup': needs_pickup,
+        'pickup_locations': ', '.join(rng.sample(PLACES, rng.randint(1, 3))) if needs_pickup else None,
+        'destination_url': None,
+        'service_category': service,
+        'comments': None,
+        'status': status,
+        'cancelled_at': trip.strftime("%d/%m/%Y 08:00 AM") if status == 'Cancelada' else None,
+        'institution_name': None,
+        'schedule_type': None,
+        'country': None,
+        'return_date': None,
+        'trip_duration': 0,
+    }
+    if service == 'Viajes Internacionales':
+        days = rng.randint(2, 10)
+        row.update(
+            date=trip.isoformat(),
+            destination=f"Tour {rng.choice(COUNTRIES)}",
+            country=rng.choice(COUNTRIES),
+            return_date=(trip + timedelta(days=days)).isoformat(),
+            trip_duration=days,
+            capacity_needed=rng.randint(10, 45),
+        )
+    elif service == 'Transporte de Estudiantes':
+        row.update(
+            date=f"{trip.day}-{trip.month}-{trip.year}",
+            destination=rng.choice(INSTITUTIONS),
+            institution_name=rng.choice(INSTITUTIONS),
+            schedule_type=_weighted(rng, SCHEDULE_WEIGHTS),
+            capacity_needed=max(1, min(50, int(rng.triangular(8, 45, 28)))),
+        )
+    else:
+        row.update(
+            date=f"{trip.day}-{trip.month}-{trip.year}",
+            destination=rng.choice(PLACES),
+            capacity_needed=max(1, min(50, int(rng.expovariate(1 / 18)) + 1)),
+        )
+    return row
+
+
+def build_collaborators(rng, count):
+    """Genera colaboradores y sus buses (1 a 3 unidades por colaborador)."""
+    colabs, buses = [], []
+    for i in range(count):
+        colabs.append({
+            'name': rng.choice(NAMES),
+            'last_name1': rng.choice(LAST_NAMES),
+            'last_name2': rng.choice(LAST_NAMES),
+            'mobile': f"{80000000 + i:08d}",
+            'email': f"chofer{i}@transavi.cr",
+            'license_type': rng.choice(['B2', 'B3', 'D1', 'D3']),
+            'ownership': rng.choice(['Propio', 'Alquilado']),
+        })
+        for _ in range(rng.choice([1, 1, 2, 3])):
+            buses.append({
+                'collaborator_index': i,
+                'brand': rng.choice(BRANDS),
+                'plate': f"SJB-{rng.randint(1000, 9999)}",
+                'year': rng.randint(2008, 2025),
+                'capacity': rng.choice([15, 22, 30, 45, 50]),
+                'service_type': _weighted(rng, SERVICE_WEIGHTS),
+            })
+    return colabs, buses
+
+
+def _bulk_insert(model, rows, batch_size=5000):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(insert(model), rows[start:start + batch_size])
+
+
+def seed(clients=1000, reservations=10000, collaborators=20, random_seed=None):
+    """
+    Inserta los datos sintéticos en la base de datos de la app activa.
+    Debe ejecutarse dentro de un app_context.
+    """
+    rng = random.Random(random_seed)
+    today = date.today()
+
+    offset = db.session.query(db.func.max(Client.id)).scalar() or 0
+    _bulk_insert(Client, build_clients(rng, clients, offset))
+    client_ids = [cid for (cid,) in db.session.query(Client.id).filter(Client.id > offset)]
+
+    # Pocos clientes (escuelas) concentran muchas reservas: distribución de Pareto
+    weights = [rng.paretovariate(1.2) for _ in client_ids]
+    owners = rng.choices(client_ids, weights=weights, k=reservations) if client_ids else []
+    _bulk_insert(Reservation, [build_reservation(rng, cid, today) for cid in owners])
+
+    colab_rows, bus_rows = build_collaborators(rng, collaborators)
+    colab_offset = db.session.query(db.func.max(Collaborator.id)).scalar() or 0
+    _bulk_insert(Collaborator, colab_rows)
+    for bus in bus_rows:
+        bus['collaborator_id'] = colab_offset + bus.pop('collaborator_index') + 1
+    _bulk_insert(Bus, bus_rows)
+
+    db.session.commit()
+    return {'clients': clients, 'reservations': reservations,
+            'collaborators': collaborators, 'buses': len(bus_rows)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos para pruebas de carga.")
+    parser.add_argument('--db', default=DEFAULT_DB_URI, help="URI de la base de datos destino")
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--reservations', type=int, default=10000)
+    parser.add_argument('--collaborators', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=None, help="Semilla para resultados reproducibles")
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.db})
+    with app.app_context():
+        totals = seed(args.clients, args.reservations, args.collaborators, args.seed)
+    print(f"Datos generados en {args.db}: {totals}")
@@ -0,0 +1,284 @@
+# Archivo: sessions.py
+"""
+Sesiones del lado del servidor.
+
+La cookie solo guarda un identificador aleatorio (sin firma que verificar en
+cada petición). El registro de la sesión vive en SQLite (instance/sessions.db),
+compartido por todos los workers, con una caché LRU en memoria por proceso.
+
+Los datos de identidad (user_id, username, role) son columnas propias, así un
+cambio de rol o la eliminación de un usuario se aplican con un solo UPDATE o
+DELETE sobre todas sus sesiones. Cada escritura queda anotada (por triggers)
+en 'session_log'; cuando 'PRAGMA data_version' indica que otro proceso
+escribió, cada worker lee solo las anotaciones nuevas y olvida esos sid, así
+una revocación llega a todos en la siguiente petición sin vaciar la caché
+completa por cada mensaje flash de un visitante anónimo.
+
+Al iniciar o cerrar sesión se emite un sid nuevo y se borra el anterior
+(rotate_session), para que un sid conocido de antemano no quede autenticado.
+"""
+import os
+import random
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+IDENTITY_KEYS = ('user_id', 'username', 'role')
+LRU_SIZE = 10000
+# Probabilidad de limpiar sesiones vencidas en cada guardado
+PURGE_PROBABILITY = 0.001
+# Anotaciones de cambios que se conservan en session_log
+LOG_KEEP = 100000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS session (
+    sid TEXT PRIMARY KEY,
+    user_id INTEGER,
+    username TEXT,
+    role TEXT,
+    data TEXT,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_session_user_id ON session (user_id);
+CREATE INDEX IF NOT EXISTS ix_session_expires ON session (expires);
+CREATE TABLE IF NOT EXISTS session_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    sid TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS tr_session_insert AFTER INSERT ON session
+BEGIN INSERT INTO session_log (sid) VALUES (NEW.sid); END;
+CREATE TRIGGER IF NOT EXISTS tr_session_update AFTER UPDATE ON session
+BEGIN INSERT INTO session_log (sid) VALUES (NEW.sid); END;
+CREATE TRIGGER IF NOT EXISTS tr_session_delete AFTER DELETE ON session
+BEGIN INSERT INTO session_log (sid) VALUES (OLD.sid); END;
+"""
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Diccionario de sesión que marca 'modified' al cambiar."""
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class SessionStore:
+    """
+    Registros de sesión en SQLite con caché LRU por proceso.
+    Una conexión por hilo; la caché se comparte entre hilos con un lock.
+    """
+    def __init__(self, path, lru_size=LRU_SIZE):
+        self.path = path
+        self.lru_size = lru_size
+        self.serializer = TaggedJSONSerializer()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_seq = None  # Última anotación de session_log aplicada a la caché
+
+    def connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.data_version = None
+            with self._lock:
+                if self._last_seq is None:
+                    self._last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM session_log").fetchone()[0]
+        return conn
+
+    def _sync(self, conn):
+        """
+        Si otra conexión escribió en la base, olvida solo los sid anotados
+        desde la última revisión (toda la caché si ya se recortó el registro).
+        """
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._local.data_version:
+            return
+        self._local.data_version = version
+        with self._lock:
+            last_seq = self._last_seq
+        rows = conn.execute("SELECT seq, sid FROM session_log WHERE seq > ? ORDER BY seq", (last_seq,)).fetchall()
+        if not rows:
+            return
+        with self._lock:
+            if rows[0][0] != last_seq + 1 and last_seq == self._last_seq:
+                self._cache.clear()  # Faltan anotaciones (recortadas): no se sabe qué cambió
+            else:
+                for _, sid in rows:
+                    self._cache.pop(sid, None)
+            self._last_seq = max(self._last_seq, rows[-1][0])
+
+    def _remember(self, sid, record):
+        with self._lock:
+            self._cache[sid] = record
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.lru_size:
+                self._cache.popitem(last=False)
+
+    def _forget(self, sid=None):
+        with self._lock:
+            if sid is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(sid, None)
+
+    def get(self, sid):
+        """Devuelve el diccionario de la sesión o None si no existe o venció."""
+        conn = self.connect()
+        self._sync(conn)
+        with self._lock:
+            record = self._cache.get(sid)
+            if record is not None:
+                self._cache.move_to_end(sid)
+        if record is None:
+            row = conn.execute(
+                "SELECT user_id, username, role, data, expires FROM session WHERE sid = ?", (sid,)).fetchone()
+            if row is None:
+                return None
+            record = row
+            self._remember(sid, record)
+
+        user_id, username, role, data, expires = record
+        if expires < time.time():
+            return None
+        values = self.serializer.loads(data) if data else {}
+        if user_id is not None:
+            values.update(user_id=user_id, username=username, role=role)
+        return values
+
+    def save(self, sid, values, expires):
+        values = dict(values)
+        identity = [values.pop(key, None) for key in IDENTITY_KEYS]
+        data = self.serializer.dumps(values) if values else None
+        record = (*identity, data, expires)
+        self.connect().execute(
+            "INSERT OR REPLACE INTO session (sid, user_id, username, role, data, expires) "
+            "VALUES (?, ?, ?, ?, ?, ?)", (sid, *record))
+        self._remember(sid, record)
+        if random.random() < PURGE_PROBABILITY:
+            self.purge_expired()
+
+    def delete(self, sid):
+        self.connect().execute("DELETE FROM session WHERE sid = ?", (sid,))
+        self._forget(sid)
+
+    def update_user(self, user_id, **fields):
+        """Actualiza la identidad (ej: rol) de todas las sesiones de un usuario."""
+        columns = {k: v for k, v in fields.items() if k in ('username', 'role')}
+        if not columns:
+            return
+        assignments = ', '.join(f"{k} = ?" for k in columns)
+        self.connect().execute(
+            f"UPDATE session SET {assignments} WHERE user_id = ?", (*columns.values(), user_id))
+        self._forget()
+
+    def revoke_user(self, user_id):
+        """Cierra todas las sesiones de un usuario en todos los workers."""
+        self.connect().execute("DELETE FROM session WHERE user_id = ?", (user_id,))
+        self._forget()
+
+    def purge_expired(self):
+        conn = self.connect()
+        conn.execute("DELETE FROM session WHERE expires < ?", (time.time(),))
+        conn.execute("DELETE FROM session_log WHERE seq <= (SELECT MAX(seq) FROM session_log) - ?", (LOG_KEEP,))
+
+
+class ServerSessionInterface(SessionInterface):
+    """Interfaz de sesión de Flask respaldada por SessionStore."""
+    session_class = ServerSession
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            values = self.store.get(sid)
+            if values is not None:
+                return self.session_class(values, sid=sid)
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not self.should_set_cookie(app, session):
+            return
+
+        expires = time.time() + app.permanent_session_lifetime.total_seconds()
+        self.store.save(session.sid, session, expires)
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def init_sessions(app):
+    """Activa las sesiones del lado del servidor para la app."""
+    path = app.config.get('SESSION_STORE_PATH') or os.path.join(app.instance_path, 'sessions.db')
+    app.session_interface = ServerSessionInterface(
+        SessionStore(path, app.config.get('SESSION_LRU_SIZE', LRU_SIZE)))
+
+
+def _store():
+    interface = current_app.session_interface
+    return interface.store if isinstance(interface, ServerSessionInterface) else None
+
+
+def rotate_session():
+    """
+    Cambia el sid de la sesión actual (al iniciar o cerrar sesión) y borra el
+    registro anterior: un sid fijado por un tercero no llega a autenticarse.
+    """
+    current = session._get_current_object()
+    store = _store()
+    if store is None or not isinstance(current, ServerSession):
+        return
+    if not current.new:
+        store.delete(current.sid)
+    current.sid = secrets.token_urlsafe(32)
+    current.new = True
+    current.modified = True
+
+
+def update_user_sessions(user_id, **fields):
+    """Propaga cambios de identidad (rol, nombre) a las sesiones abiertas."""
+    store = _store()
+    if store:
+        store.update_user(user_id, **fields)
+
+
+def revoke_user_sessions(user_id):
+    """Invalida de inmediato todas las sesiones del usuario."""
+    store = _store()
+    if store:
+        store.revoke_user(user_id)
@@ -0,0 +1,368 @@
+# Archivo: tasks.py
+"""
+Cola de tareas local respaldada por SQLite (instance/tasks.db).
+
+Los efectos secundarios de una reserva (avisos a administradores, reporte
+exportado, resúmenes de demanda) se encolan DESPUÉS del commit, así '/reserve'
+responde en cuanto la fila de la reserva queda guardada. Los workers toman las
+tareas, reintentan con espera exponencial y, al agotar los intentos, las dejan
+en estado 'dead' (dead-letter) para revisión manual.
+
+Los resúmenes de demanda (DemandRollup) se recalculan por día y categoría
+cada vez que se confirma un cambio en alguna reserva (alta, edición,
+cancelación, borrado o archivado), no solo al crearla.
+
+Uso:
+    python tasks.py worker --processes 2
+    python tasks.py status
+    python tasks.py retry-dead
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Reservation, DemandRollup
+
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 2          # Espera antes del reintento n: BACKOFF_SECONDS * 2**(n-1)
+LEASE_SECONDS = 300          # Una tarea 'running' más vieja que esto se considera abandonada
+POLL_SECONDS = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS task (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',   -- queued, running, done, dead
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    locked_by TEXT,
+    locked_at REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    rerun INTEGER NOT NULL DEFAULT 0         -- pedida otra vez mientras corría
+);
+CREATE INDEX IF NOT EXISTS ix_task_status_run_at ON task (status, run_at);
+"""
+
+# Registro nombre -> función, se llena con el decorador @task
+TASKS = {}
+
+
+def task(name):
+    """Registra una función como tarea ejecutable por los workers."""
+    def decorator(f):
+        TASKS[name] = f
+        return f
+    return decorator
+
+
+class TaskQueue:
+    """
+    Acceso a la tabla de tareas. Una conexión por hilo, en modo WAL para que
+    la web pueda encolar mientras los workers leen.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            if 'rerun' not in {row[1] for row in conn.execute("PRAGMA table_info(task)")}:
+                conn.execute("ALTER TABLE task ADD COLUMN rerun INTEGER NOT NULL DEFAULT 0")
+            self._local.conn = conn
+        return conn
+
+    def enqueue_many(self, jobs, max_attempts=MAX_ATTEMPTS):
+        """
+        Encola varias tareas (name, payload, unique) en una sola transacción.
+        Con unique=True no se duplica una tarea idéntica que esté en cola o
+        corriendo; si está corriendo se marca para correr una vez más al
+        terminar (pudo haber leído el estado antes de este cambio).
+        """
+        conn = self.connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for name, payload, unique in jobs:
+                payload_json = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+                if unique:
+                    existing = conn.execute(
+                        "SELECT id, status FROM task WHERE status IN ('queued', 'running') "
+                        "AND name = ? AND payload = ? ORDER BY status = 'running' LIMIT 1",
+                        (name, payload_json)).fetchone()
+                    if existing:
+                        if existing[1] == 'running':
+                            conn.execute("UPDATE task SET rerun = 1 WHERE id = ?", (existing[0],))
+                        continue
+                conn.execute(
+                    "INSERT INTO task (name, payload, max_attempts, run_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (name, payload_json, max_attempts, now, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def enqueue(self, name, payload=None, unique=False):
+        self.enqueue_many([(name, payload or {}, unique)])
+
+    def claim(self, worker_id):
+        """Toma la siguiente tarea lista (o abandonada) de forma atómica."""
+        conn = self.connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, name, payload, attempts, max_attempts FROM task "
+                "WHERE (status = 'queued' AND run_at <= ?) OR (status = 'running' AND locked_at < ?) "
+                "ORDER BY run_at LIMIT 1",
+                (now, now - LEASE_SECONDS)).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE task SET status = 'running', locked_by = ?, locked_at = ?, attempts = attempts + 1 "
+                    "WHERE id = ?", (worker_id, now, row[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if not row:
+            return None
+        task_id, name, payload, attempts, max_attempts = row
+        return {'id': task_id, 'name': name, 'payload': json.loads(payload),
+                'attempts': attempts + 1, 'max_attempts': max_attempts}
+
+    def complete(self, task_id):
+        """Marca la tarea como hecha, o la reencola si se pidió de nuevo mientras corría."""
+        self.connect().execute(
+            "UPDATE task SET status = CASE WHEN rerun THEN 'queued' ELSE 'done' END, "
+            "attempts = CASE WHEN rerun THEN 0 ELSE attempts END, run_at = ?, rerun = 0, "
+            "locked_by = NULL, last_error = NULL WHERE id = ?", (time.time(), task_id))
+
+    def fail(self, job, error):
+        """Reprograma con espera exponencial o pasa a dead-letter."""
+        if job['attempts'] >= job['max_attempts']:
+            self.connect().execute(
+                "UPDATE task SET status = 'dead', locked_by = NULL, last_error = ? WHERE id = ?",
+                (error, job['id']))
+            return 'dead'
+        delay = BACKOFF_SECONDS * 2 ** (job['attempts'] - 1)
+        self.connect().execute(
+            "UPDATE task SET status = 'queued', locked_by = NULL, run_at = ?, last_error = ?, rerun = 0 "
+            "WHERE id = ?",
+            (time.time() + delay, error, job['id']))
+        return 'queued'
+
+    def retry_dead(self):
+        cursor = self.connect().execute(
+            "UPDATE task SET status = 'queued', attempts = 0, run_at = ? WHERE status = 'dead'", (time.time(),))
+        return cursor.rowcount
+
+    def purge_done(self, older_than_seconds=7 * 24 * 3600):
+        cursor = self.connect().execute(
+            "DELETE FROM task WHERE status = 'done' AND created_at < ?", (time.time() - older_than_seconds,))
+        return cursor.rowcount
+
+    def counts(self):
+        return dict(self.connect().execute("SELECT status, COUNT(*) FROM task GROUP BY status").fetchall())
+
+
+_queues = {}
+
+def get_queue():
+    """Cola de la app activa (una instancia por archivo y proceso)."""
+    path = current_app.config.get('TASK_QUEUE_PATH') or os.path.join(current_app.instance_path, 'tasks.db')
+    if path not in _queues:
+        _queues[path] = TaskQueue(path)
+    return _queues[path]
+
+
+def enqueue_reservation_side_effects(reservation_id):
+    """
+    Encola los efectos secundarios de una reserva recién guardada.
+    Un fallo al encolar nunca debe tumbar la reserva: solo se registra.
+    """
+    try:
+        get_queue().enqueue_many([
+            ('notify_admins', {'reservation_id': reservation_id}, False),
+            ('regenerate_export', {}, True),
+        ])
+    except sqlite3.Error:
+        current_app.logger.exception("No se pudieron encolar las tareas de la reserva #%s", reservation_id)
+
+
+def enqueue_rollups(pairs):
+    """Encola el recálculo de cada (día, categoría) afectado por un cambio ya confirmado."""
+    jobs = [('update_rollups', {'day': day, 'service_category': category}, True)
+            for day, category in sorted(pairs, key=repr) if day]
+    if not jobs:
+        return
+    try:
+        get_queue().enqueue_many(jobs)
+    except sqlite3.Error:
+        current_app.logger.exception("No se pudo encolar el recálculo de %s resúmenes", len(jobs))
+
+
+# Cambios de reservas hechos con el ORM: se anotan los (día, categoría) de
+# antes y después en cada flush y se encolan recién después del commit
+@event.listens_for(Session, 'after_flush')
+def _collect_rollup_keys(session, flush_context):
+    keys = session.info.setdefault('rollup_keys', set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Reservation):
+            attrs = inspect(obj).attrs
+            days = {obj.date, *attrs.date.history.deleted}
+            categories = {obj.service_category, *attrs.service_category.history.deleted}
+            keys.update((d, c) for d in days for c in categories)
+
+@event.listens_for(Session, 'after_commit')
+def _enqueue_rollup_keys(session):
+    keys = session.info.pop('rollup_keys', None)
+    if keys:
+        enqueue_rollups(keys)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rollup_keys(session):
+    session.info.pop('rollup_keys', None)
+
+
+# ==========================================
+# TAREAS REGISTRADAS
+# ==========================================
+@task('notify_admins')
+def notify_admins(reservation_id):
+    """Deja constancia de la nueva solicitud para los administradores."""
+    res = db.session.get(Reservation, reservation_id)
+    if res is None:
+        return
+    cliente = f"{res.client.name} {res.client.last_name1}" if res.client else "Sin Cliente"
+    line = (f"{time.strftime('%d/%m/%Y %H:%M')} | Nueva solicitud #{res.id} | {res.service_category} | "
+            f"Cliente: {cliente} | Salida: {res.date} {res.departure_time} | {res.capacity_needed} pax\n")
+    with open(os.path.join(current_app.instance_path, 'notificaciones.log'), 'a') as f:
+        f.write(line)
+
+@task('update_rollups')
+def update_rollups(day=None, service_category=None, reservation_id=None):
+    """
+    Recalcula desde Reservation el resumen de un día/categoría, sin contar las
+    canceladas (idempotente ante reintentos). 'reservation_id' queda por las
+    tareas encoladas con el formato anterior.
+    """
+    if reservation_id is not None:
+        res = db.session.get(Reservation, reservation_id)
+        if res is None:
+            return
+        day, service_category = res.date, res.service_category
+    count, seats = db.session.query(
+        db.func.count(Reservation.id), db.func.coalesce(db.func.sum(Reservation.capacity_needed), 0)
+    ).filter(Reservation.date == day, Reservation.service_category == service_category,
+             Reservation.status.is_distinct_from('Cancelada')).one()
+    rollup = DemandRollup.query.filter_by(day=day, service_category=service_category).first()
+    if count == 0:
+        if rollup is not None:
+            db.session.delete(rollup)
+    else:
+        if rollup is None:
+            rollup = DemandRollup(day=day, service_category=service_category)
+            db.session.add(rollup)
+        rollup.reservations = count
+        rollup.seats = seats
+    db.session.commit()
+
+@task('regenerate_export')
+def regenerate_export():
+    """Regenera reporte_reservas.txt con el estado actual."""
+    from rutas import write_export_report
+    write_export_report()
+
+@task('compact_audit')
+def compact_audit():
+    """Mueve los eventos viejos de la bitácora a segmentos (ver audit.py)."""
+    from audit import compact
+    compact()
+
+
+# ==========================================
+# WORKERS
+# ==========================================
+def run_worker(stop_after_idle=None, test_config=None):
+    """Bucle de un worker: toma, ejecuta y confirma tareas dentro del app_context."""
+    from app import create_app
+
+    app = create_app(test_config)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    idle_since = time.time()
+    with app.app_context():
+        queue = get_queue()
+        while True:
+            job = queue.claim(worker_id)
+            if job is None:
+                if stop_after_idle is not None and time.time() - idle_since > stop_after_idle:
+                    return
+                time.sleep(POLL_SECONDS)
+                continue
+            idle_since = time.time()
+            try:
+                func = TASKS.get(job['name'])
+                if func is None:
+                    raise LookupError(f"Tarea desconocida: {job['name']}")
+                func(**job['payload'])
+                queue.complete(job['id'])
+            except Exception:
+                db.session.rollback()
+                outcome = queue.fail(job, traceback.format_exc(limit=5))
+                app.logger.warning("Tarea %s #%s falló (intento %s) -> %s",
+                                   job['name'], job['id'], job['attempts'], outcome)
+            finally:
+                db.session.remove()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cola de tareas en segundo plano.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_worker = sub.add_parser('worker', help="Inicia los procesos worker")
+    p_worker.add_argument('--processes', type=int, default=1)
+    p_worker.add_argument('--exit-when-idle', type=float, default=None,
+                          help="Termina tras N segundos sin tareas (útil en cron)")
+    p_worker.add_argument('--db', help="URI de la base de datos (por defecto la de la app)")
+    sub.add_parser('status', help="Muestra la cantidad de tareas por estado")
+    sub.add_parser('retry-dead', help="Reencola las tareas en dead-letter")
+    sub.add_parser('purge', help="Borra las tareas completadas de más de 7 días")
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        config = {'SQLALCHEMY_DATABASE_URI': args.db} if args.db else None
+        procs = [multiprocessing.Process(target=run_worker, args=(args.exit_when_idle, config))
+                 for _ in range(max(1, args.processes))]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+    else:
+        from app import create_app
+        with create_app().app_context():
+            queue = get_queue()
+            if args.command == 'status':
+                print(queue.counts())
+            elif args.command == 'retry-dead':
+                print(f"Tareas reencoladas: {queue.retry_dead()}")
+            else:
+                print(f"Tareas eliminadas: {queue.purge_done()}")
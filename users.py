@@ -1,6 +1,7 @@
 # Archivo: users.py
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, abort
 from extensions import db, bcrypt
+from sessions import update_user_sessions, revoke_user_sessions, rotate_session
 from functools import wraps
 
 # Definimos el Blueprint 'users'
@@ -37,11 +38,13 @@ class User(db.Model):
 # ==========================================
 # 2. DECORADORES DE SEGURIDAD
 # ==========================================
+# La identidad se resuelve desde el registro de sesión del servidor (sessions.py),
+# por lo que un cambio de rol o una eliminación aplica en la siguiente petición.
 def login_required(f):
     """Restringe el acceso a usuarios logueados."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if session.get('user_id') is None:
             flash("Debe iniciar sesión para acceder a esta sección.", "warning")
             return redirect(url_for('users.login'))
         return f(*args, **kwargs)
@@ -51,7 +54,7 @@ def admin_required(f):
     """Restringe el acceso solo a administradores."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'role' not in session or session['role'] != 'admin':
+        if session.get('role') != 'admin':
             flash("Acceso denegado. Se requieren permisos de administrador.", "danger")
             return redirect(url_for('main.dashboard'))
         return f(*args, **kwargs)
@@ -119,6 +122,7 @@ def login():
         user = User.query.filter_by(email=email).first()
         
         if user and user.check_password(password):
+            rotate_session()
             session['user_id'] = user.id
             session['username'] = user.username
             session['role'] = user.role
@@ -135,6 +139,7 @@ def logout():
     Cierra la sesión del usuario.
     """
     session.clear()
+    rotate_session()
     flash("Sesión cerrada correctamente.", "info")
     return redirect(url_for('users.login'))
 
@@ -167,10 +172,14 @@ def delete_user(user_id):
         flash("No puedes eliminar tu propia cuenta de administrador mientras estás logueado.", "warning")
         return redirect(url_for('main.dashboard'))
 
+    from audit import record  # import diferido: audit.py importa este módulo
+
     user = User.query.get_or_404(user_id)
     try:
+        record('user', user.id, 'delete', {'username': user.username, 'email': user.email, 'role': user.role})
         db.session.delete(user)
         db.session.commit()
+        revoke_user_sessions(user_id)
         flash(f"Usuario {user.username} eliminado correctamente.", "success")
     except Exception as e:
         db.session.rollback()
@@ -194,8 +203,11 @@ def change_role(user_id):
              flash("No puedes quitarte tus propios permisos de administrador.", "warning")
              return redirect(url_for('users.manage_users'))
 
+        from audit import record  # import diferido: audit.py importa este módulo
+        record('user', user.id, 'role', {'from': user.role, 'to': new_role})
         user.role = new_role
         db.session.commit()
+        update_user_sessions(user.id, role=new_role)
         flash(f"Rol de {user.username} actualizado a {new_role}.", "success")
     else:
         flash("Rol no válido.", "danger")